@@ -1,4 +1,3 @@
-import pickle
 import sys
 import traceback
 import webbrowser
@@ -8,22 +7,29 @@ import ctypes
 import os
 import shutil
 from datetime import datetime
+from multiprocessing import freeze_support
 from tkinter import filedialog, messagebox
 
 from Scripts.constants import *
 from Scripts.console_window import *
-get_console()
-with open(debug_log_file, 'w') as _:
-    pass
-# Creates AppData folder if doesn't exist
-if not os.path.exists(DEBUG):
-    os.makedirs(DEBUG)
+# The processes that make no guessing boards import this file, only the app itself sets things up
+if __name__ == '__main__':
+    freeze_support()
+    get_console()
+    with open(debug_log_file, 'w') as _:
+        pass
+    # Creates AppData folder if doesn't exist
+    if not os.path.exists(DEBUG):
+        os.makedirs(DEBUG)
 from Scripts.base_logger import init_logger
 init_logger()
 from Scripts.custom_menubar import CustomMenuBar
-from Scripts.squares import PickleSquare, Square
-from Scripts.grid import ButtonGrid, PickleButtonGrid
-from Scripts.squares import PickleSquare, Square
+from Scripts.squares import SquareCanvas
+from Scripts.grid import ButtonGrid
+from Scripts.chunks import ChunkedBoard
+from Scripts import save_file, journal, no_guess
+from Scripts.highscores import HighscoreStore, delete_database
+from Scripts.board_pool import BoardPool
 
 
 from Scripts.network import check_internet
@@ -94,8 +100,8 @@ def dark_title_bar(window):
 def more_info(
     num_mines,
     mines_found,
-    squares_clicked_on,
-    squares_not_clicked_on,
+    squares_clicked_on: int,
+    squares_not_clicked_on: int,
     start,
     session_start,
     total_squares
@@ -103,8 +109,8 @@ def more_info(
     messagebox.showinfo('Additional Information', f'''
 Total Mines: {num_mines}
 Mines found: {mines_found}
-Squares clicked on: {len(squares_clicked_on)}
-Squares not clicked on: {len(squares_not_clicked_on)}
+Squares clicked on: {squares_clicked_on}
+Squares not clicked on: {squares_not_clicked_on}
 Total squares: {total_squares}
 Ratio of mines: {round((num_mines/total_squares) * 100, 2)}%
 Started Game: {start.strftime(STRFTIME)}
@@ -116,37 +122,38 @@ def save_game(
     start,
     total_time,
     grid,
-    zeros_checked,
     num_mines,
     chording,
+    status: StringVar
 ):
-    global difficulty
     logging.info(f'''Saving game with the following attributes:
 
 start:               {start}
 total_time:          {total_time}
 grid:                {grid}
-zeros_checked:       {zeros_checked}
 num_mines:           {num_mines}
 chording:            {chording}
 grid.grid_size       {grid.grid_size}
 ''')
-    data = {
-        'start': start,
-        'time played': total_time,
-        'grid': PickleButtonGrid.from_grid(grid),
-        'zeros checked': zeros_checked,
-        'num mines': num_mines,
-        'chording': chording,
-        'difficulty': difficulty.get()
-    }
-    logging.info(f'Data to save: {data}')
-    with filedialog.asksaveasfile('wb', filetypes=(('Pit Mopper Game Files', '*.min'), ('Any File', '*.*'))) as f:  # Pickling
-        messagebox.showinfo('Save Game', 'You game is being saved right now, this may a few moments. Please wait until another popup comes before closing the game.')
-        logging.info('Saving data...')
-        pickle.dump(data, f)
-        logging.info('Data successfully saved')
-        messagebox.showinfo('Save Game', 'Your game has been saved, you can now close the game.')
+    path = filedialog.asksaveasfilename(defaultextension='.min', filetypes=(('Pit Mopper Game Files', '*.min'), ('Any File', '*.*')))
+    if not path:
+        return
+    logging.info('Saving data...')
+    save = save_file.BackgroundSave(path, grid.board, total_time, start, chording)
+    save.start()
+    status.set('Saving...')
+
+    def check_save():
+        if save.is_alive():
+            window.after(100, check_save)
+        elif save.error != None:
+            logging.error(f'Could not save game: {save.error}')
+            status.set(f'Could not save: {save.error}')
+        else:
+            logging.info('Data successfully saved')
+            status.set(f'Saved to {os.path.basename(path)}')
+
+    window.after(100, check_save)
 
 
 def load_game(_=None):
@@ -156,37 +163,33 @@ def load_game(_=None):
         return
     else:
         logging.info(f'Reading {file}...')
-        with file as f:  # Un Pickling
-            data = pickle.load(f)
-            data: dict[str]
+        with file as f:
+            data = save_file.load_game(f)
     logging.info(f'{file} successfully read, setting up game...')
+    open_game(data)
 
+
+def open_game(data: dict):
     game_window = Toplevel(window)
     game_window.iconbitmap(LOGO)
     game_window.title('Pit Mopper')
 
-    grid = data['grid'].grid
-    button_grid = ButtonGrid(data['grid'].grid_size, game_window, grid, dark_mode_state.get())
+    board = data['board']
+    button_grid = ButtonGrid(board.grid_size, game_window, dark_mode=dark_mode_state.get(), board=board)
 
     start: datetime = data['start']
     time = data['time played']
     num_mines: int = data['num mines']
-    zeros_checked = data['zeros checked']
     chording = data['chording']
     game_window.grid_columnconfigure(1, weight=1)
 
-    mines_found = 0
-    for row in button_grid.grid:
-        for square in row:
-            if square.category == 'mine' and square.cget('text') == '🚩':
-                mines_found += 1
+    mines_found = board.correct_flags
 
     create_game(
         None,
         game_window,
         start,
         button_grid,
-        zeros_checked,
         num_mines,
         chording,
         mines_found,
@@ -199,13 +202,11 @@ def create_game(
     game_window: Toplevel = None,
     start: datetime = None,
     grid: ButtonGrid = None,
-    zeros_checked: list[Square] = [],
     num_mines: int = 0,
     chording: bool = None,
     mines_found: int = 0,
     additional_time: float = 0.0
 ):
-    global after_cancel
     if game_window == None:
         game_window = Toplevel(window)
         game_window.iconbitmap(LOGO)
@@ -220,9 +221,6 @@ def create_game(
             messagebox.showerror(title='Game Size not chosen', message='You have not chosen a game size!')
             game_window.destroy()
             return
-        elif difficulty.get() >= (60, 60):
-            logging.warning(f'Size too big {difficulty.get()}')
-            messagebox.showwarning(title='Size too big', message='Warning: When the game is a size of 60x60 or above, the expierence might be so laggy it is unplayable.')
         elif mines.get() > (difficulty.get()[0] * difficulty.get()[1]) - 10:
             logging.error(f'Mines too high, game size {difficulty.get()}, mines: {mines.get()}')
             messagebox.showerror(title='Mines too high', message='You have chosen too many mines.')
@@ -233,9 +231,6 @@ def create_game(
             messagebox.showerror('Mines too low', 'You cannot have a mine count below 0 with -1 being a special number')
             game_window.destroy()
             return
-        elif mines.get() > ((difficulty.get()[0] * difficulty.get()[1])/2):
-            logging.warning(f'Number of mines high, game size {difficulty.get()}, mines: {mines.get()}')
-            messagebox.showwarning(title='Number of mines high', message='You have chosen a high amount of mines, so it might take a long time to place them all')
 
     if dark_mode_state.get():
         dark_title_bar(game_window)
@@ -245,7 +240,6 @@ def create_game(
 game_window:           {game_window}
 start:                 {start}
 grid:                  {grid}
-zeros_checked:         {zeros_checked}
 num_mines:             {num_mines}
 chording:              {chording}
 mines_found:           {mines_found}
@@ -256,50 +250,108 @@ additional_time:       {additional_time}
 
     Label(game_window, textvariable=total_time, bg=CURRENT_BG, fg=CURRENT_FG).grid(
         row=1, column=1, sticky=N+S+E+W, pady=(5, 0))
+    save_status = StringVar(game_window)
+    Label(game_window, textvariable=save_status, bg=CURRENT_BG, fg=CURRENT_FG).grid(
+        row=3, column=1, sticky=E+W)
     game_window.config(bg=CURRENT_BG)
 
     if grid == None:
         logging.info('Creating grid of buttons...')
-        grid = ButtonGrid(difficulty.get(), game_window, dark_mode=dark_mode_state.get(), num_mines=mines.get())
-        if APP_CLOSED:
-            try:
-                game_window.destroy()
-            except TclError:
-                return
-        for row in grid.grid:
-            for square in row:
-                if square.category == 'mine':
-                    num_mines += 1
-
-    squares_clicked_on = [
-        square
-        for row in grid.grid
-        for square in row
-        if square.clicked_on
-    ]
-
-    squares_not_clicked_on = [
-        square
-        for row in grid.grid
-        for square in row
-        if square.clicked_on == False
-    ]
-
-    if additional_time != 0.0:
-        total_time.set(f'Time: {format_second(int(additional_time))} 🚩0/{num_mines}💣')
-
-    highscore_data = load_highscore()
-    game_size_str = f'{difficulty.get()[0]}x{difficulty.get()[1]}'
+        grid = ButtonGrid(difficulty.get(), game_window, dark_mode=dark_mode_state.get(), num_mines=mines.get(), no_guessing=no_guess_state.get(), pool=board_pool)
+        num_mines = grid.num_mines
+        logging.info(f'Board seed: {grid.board.seed}')
+    board = grid.board
+    grid.chording = chording
+
+    game_size_str = f'{board.rows}x{board.cols}'
     game_window.title(f'{game_size_str} Pit Mopper Game')
     logging.info(f'{game_size_str} Pit Mopper Game starting...')
-    if not isinstance(highscore_data, float):
-        try:
-            highscore = highscore_data[game_size_str]
-        except KeyError:
-            highscore = float('inf')
-    else:
-        highscore = float('inf')
+    highscore = highscore_store.best(board.grid_size)
     seconds = additional_time
+    timer = None
+
+    def update_label():
+        flags = board.flags_placed
+        percent = round((flags/num_mines) * 100, 2)
+        total_time.set(f'Time: {format_second(seconds)}  🚩 {flags}/{num_mines} 💣 ({percent}%)')
+
+    def tick():
+        nonlocal seconds, timer
+        after_cancel.discard(timer)
+        if APP_CLOSED:
+            return
+        seconds = (datetime.now() - session_start).total_seconds() + additional_time
+        update_label()
+        timer = window.after(1000, tick)
+        after_cancel.add(timer)
+
+    def stop_timer():
+        window.after_cancel(timer)
+        after_cancel.discard(timer)
+
+    def close_journal():
+        game_journal.close(delete=True)
+        open_journals.discard(game_journal)
+
+    def close_game(_=None):
+        grid.playing = False
+        grid.stop_search()
+        stop_timer()
+        close_journal()
+        if isinstance(board, ChunkedBoard):
+            # Lets the file the game was opened from be saved over or deleted
+            board.close_source()
+        game_window.destroy()
+
+    def square_changed(_):
+        if board.is_won():
+            logging.info('Game has been won because every square without a mine is clicked')
+            end_game(True)
+        elif board.is_lost():
+            logging.info('The game is over, and it is lost.')
+            end_game(False)
+        else:
+            update_label()
+
+    def end_game(win: bool):
+        nonlocal seconds
+        grid.playing = False
+        stop_timer()
+        close_journal()
+        seconds = (datetime.now() - session_start).total_seconds() + additional_time
+        update_label()
+
+        mines_found = grid.show_results()
+        game_window.update()
+
+        if win:
+            messagebox.showinfo(
+                'Game Over', f'Game Over.\nYou won!\nYou found {mines_found} out of {num_mines} mines.\nTime: {format_second(seconds)}\nHighscore: {format_second(highscore)}')
+        else:
+            messagebox.showinfo(
+                'Game Over', f'Game Over.\nYou lost.\nYou found {mines_found} out of {num_mines} mines.\nTime: {format_second(seconds)}\nHighscore: {format_second(highscore)}')
+        if win and seconds < highscore:
+            logging.info('Highscore has been beaten')
+        highscore_store.record_game(board.grid_size, num_mines, seconds, win, board.three_bv())
+        logging.info('Destroying window')
+        game_window.destroy()
+
+    def show_more_info(_=None):
+        clicked = board.clicked_count
+        more_info(num_mines, board.correct_flags, clicked, board.size - clicked, start, session_start, board.size)
+
+    def show_hint(_=None):
+        if not grid.playing or grid.hint() != None:
+            return
+        guess = grid.best_guess()
+        if guess != None:
+            messagebox.showinfo('Hint', f'No square can be proven safe, the best guess has a {round(guess[1] * 100, 1)}% chance of being a mine')
+
+    def auto_solve(_=None):
+        opened = grid.auto_solve()
+        logging.info(f'Auto solve opened {opened} squares')
+        if grid.playing and not opened:
+            messagebox.showinfo('Auto Solve', 'No square can be proven safe, the next click has to be a guess')
 
     # create a menubar
     menubar = CustomMenuBar(game_window, bg=CURRENT_BG, fg=CURRENT_FG)
@@ -310,158 +362,34 @@ additional_time:       {additional_time}
         menubar,
         tearoff=0
     )
-    game_window.bind('<Control-s>', lambda _: save_game(start, seconds, grid, zeros_checked, num_mines, chording))
-    game_window.bind('<Alt-q>', lambda _: game_window.destroy())
-    game_window.bind('<Alt-i>', lambda _: more_info(
-        num_mines, mines_found, squares_clicked_on, squares_not_clicked_on, start, session_start,  grid.grid_size[0] * grid.grid_size[1]))
-
-    file_menu.add_command(label='Save As', accelerator='Ctrl+S', command=partial(save_game, start, seconds, grid, [
-                          PickleSquare.from_square(square) for square in zeros_checked], num_mines, chording))
-    file_menu.add_command(label='More Info', command=lambda: more_info(
-        num_mines, mines_found, squares_clicked_on, squares_not_clicked_on, start, session_start, grid.grid_size[0] * grid.grid_size[1]),
-        accelerator='Alt+I')
-    file_menu.add_command(label='Exit', command=game_window.destroy, accelerator='Alt+Q')
+    game_window.bind('<Control-s>', lambda _: save_game(start, seconds, grid, num_mines, chording, save_status))
+    game_window.bind('<Alt-q>', close_game)
+    game_window.bind('<Alt-i>', show_more_info)
+    game_window.bind('<Alt-h>', show_hint)
+    game_window.bind('<Alt-s>', auto_solve)
+    game_window.bind('<Alt-m>', lambda _: grid.toggle_heat_map())
+    game_window.protocol('WM_DELETE_WINDOW', close_game)
+
+    file_menu.add_command(label='Save As', accelerator='Ctrl+S', command=lambda: save_game(start, seconds, grid, num_mines, chording, save_status))
+    file_menu.add_command(label='More Info', command=show_more_info, accelerator='Alt+I')
+    file_menu.add_command(label='Hint', command=show_hint, accelerator='Alt+H')
+    file_menu.add_command(label='Auto Solve', command=auto_solve, accelerator='Alt+S')
+    file_menu.add_command(label='Mine Chances', command=grid.toggle_heat_map, accelerator='Alt+M')
+    file_menu.add_command(label='Exit', command=close_game, accelerator='Alt+Q')
 
     menubar.add_menu(menu=file_menu, title='File')
-    previous_sec = datetime.now()
-    previous_sec = previous_sec.replace(microsecond=0)
-    squares_flaged = []
-    squares_checked = []
 
-    logging.info('Entering while loop...')
-    while True:
-        if APP_CLOSED:
-            try:
-                game_window.destroy()
-            except TclError:
-                pass
-            return
-        after_cancel.append(window.after(100, do_nothing))
-
-        now = datetime.now()
-        now = now.replace(microsecond=0)
-        if now > previous_sec:
-            previous_sec = now
-            seconds = (now - session_start).total_seconds() + additional_time
-
-        percent = round(((len(squares_flaged))/num_mines) * 100, 2)
-        total_time.set(f'Time: {format_second(seconds)}  🚩 {len(squares_flaged)}/{num_mines} 💣 ({percent}%)')
-
-        for row in grid.iter_rows():
-            # Clicks Zeros
-            for square in (square for square in row if (square.num == None) and (square.clicked_on) and (square not in zeros_checked) and (square.category != 'mine')):
-                zeros_checked.append(square)
-                for square2 in (square2 for square2 in grid.around_square(*square.position) if (square2.category != 'mine') and square2 not in squares_checked):
-                    square2.clicked()
-
-            # Counts mines found
-            for square in (square for square in squares_flaged if square.category == 'mine'):
-                mines_found += 1
-
-            if chording:
-                # Checks all square if they are completed
-                for square in (square for square in row if square.completed == False):
-                    mines_around_square = [square for square in grid.around_square(
-                        *square.position) if (square.category == 'mine') and (square.clicked_on == True)]
-                    if (len(mines_around_square) == square.num and all(mine.category == 'mine' for mine in mines_around_square)) or square.num == None:
-                        square.completed = True
-
-                # Shows all squares around a square if it was middle clicked
-                for square in (square for square in row if (square.chord)):
-                    if square.completed == False:
-                        precolors = []
-                        squares = [
-                            square
-                            for square in grid.around_square(*square.position)
-                            if square.clicked_on == False
-                        ]
-                        for square2 in squares:
-                            precolors.append(square2.cget('bg'))
-                            square2.config(bg='brown')
-                        game_window.update()
-                        game_window.after(1000)
-                        for square2 in squares:
-                            precolor = precolors[squares.index(square2)]
-                            square2.config(bg=precolor)
-                    else:
-                        for square2 in (square for square in grid.around_square(*square.position) if not square.clicked_on and square.category != 'mine'):
-                            square2.clicked()
-                        square.chord = False
-        mines_found = 0
-
-        squares_clicked_on = [
-            square
-            for row in grid.grid
-            for square in row
-            if square.clicked_on
-        ]
-
-        squares_not_clicked_on = [
-            square
-            for row in grid.grid
-            for square in row
-            if square.clicked_on == False
-        ]
-
-        squares_flaged = [
-            square
-            for row in grid.grid
-            for square in row
-            if square.flaged
-        ]
-
-        game_overs = [
-            square.game_over
-            for row in grid.grid
-            for square in row
-        ]
-
-        if (len(squares_clicked_on) == (grid.grid_size[0] * grid.grid_size[1]) and all(square.category == 'mine' for square in squares_flaged)) or \
-                (all(square.category == 'mine' for square in squares_not_clicked_on) and len(squares_not_clicked_on) == num_mines):
-            game_over = True
-            win = True
-            if (len(squares_clicked_on) == (grid.grid_size[0] * grid.grid_size[1]) and all(square.category == 'mine' for square in squares_flaged)):
-                logging.info('Game has been won because all squares are clicked and all mines flagged')
-            else:
-                logging.info('Game has been won because the squares left are mines')
-        elif any(game_overs):
-            logging.info('The game is over, and it is lost.')
-            game_over = True
-            win = False
-        else:
-            game_over = False
-
-        if game_over:
-            for row in grid.grid:
-                for square in row:
-                    if square.category == 'mine' and square.cget('text') != '🚩':
-                        square.clicked()
-                    elif square.category == 'mine' and square.cget('text') == '🚩':
-                        mines_found += 1
-                        square.config(text='✅')
-                    elif square.num != None and square.cget('text') == '🚩':
-                        square.config(text='❌')
-            game_window.update()
-            break
-        game_window.update()
+    game_journal = journal.Journal(board, start, chording, seconds)
+    open_journals.add(game_journal)
 
-    if win:
-        messagebox.showinfo(
-            'Game Over', f'Game Over.\nYou won!\nYou found {mines_found} out of {num_mines} mines.\nTime: {format_second(seconds)}\nHighscore: {format_second(highscore)}')
-    else:
-        messagebox.showinfo(
-            'Game Over', f'Game Over.\nYou lost.\nYou found {mines_found} out of {num_mines} mines.\nTime: {format_second(seconds)}\nHighscore: {format_second(highscore)}')
-    if win and seconds < highscore:
-        logging.info('Highscore has been beaten, writing new highscore data')
-        with open(HIGHSCORE_TXT, 'wb') as f:
-            if isinstance(highscore_data, dict):
-                new_highscore_data = highscore_data.copy()
-            else:
-                new_highscore_data = {}
-            new_highscore_data[game_size_str] = seconds
-            pickle.dump(new_highscore_data, f)
-    logging.info('Destroying window')
-    game_window.destroy()
+    def record_move(move: int, index: int):
+        game_journal.record(move, index, (datetime.now() - session_start).total_seconds() + additional_time)
+
+    grid.on_change = square_changed
+    grid.on_move = record_move
+    grid.on_status = save_status.set
+    logging.info('Waiting for squares to be clicked...')
+    tick()
 
 
 def change_difficulty(from_spinbox:bool = False):
@@ -474,48 +402,17 @@ def change_difficulty(from_spinbox:bool = False):
         logging.info(f'Setting custom game size: {(rows.get(), cols.get())}')
         difficulty.set((rows.get(), cols.get()))
     game_size.set(f'Your game size will be {difficulty.get()[0]} rows and {difficulty.get()[1]} columns')
+    warm_board_pool()
 
 
-def load_highscore() -> dict[str, float | int] | float:
-    logging.info('Loading highscore...')
-    if not os.path.exists(HIGHSCORE_TXT):
-        logging.info(f'{HIGHSCORE_TXT} does not exist, looking in root directory')
-        if not os.path.exists(os.path.join(os.getcwd(), 'highscore.txt')):
-            logging.info('No highscore was found')
-            return float('inf')
-        else:
-            with open(os.path.join(os.getcwd(), 'highscore.txt'), 'rb') as f:
-                value = pickle.load(f)
-            if isinstance(value, dict):
-                logging.info(f'highscore.txt successfully read')
-            else:
-                logging.info(f'highscore.txt contains invalid data: {value}')
-                messagebox.showerror('Highscore value invalide', 'The highscore file contains an invalid value, press OK to delete the content of it')
-                logging.info('Removing file...')
-                os.remove(HIGHSCORE_TXT)
-                value = float('inf')
-            messagebox.showerror('Highscore file in wrong place', 'The highscore file was found, but in the wrong spot, as soon as you click OK, Pit Mopper will attempt to move the file to a new location, you might have to delete the file yourself.')
-            if not isinstance(value, float):
-                with open(HIGHSCORE_TXT, 'wb') as f:
-                    pickle.dump(value, f)
-            try:
-                os.remove(os.path.join(os.getcwd(), 'highscore.txt'))
-            except:
-                messagebox.showerror('File Delete', 'Unable to delete file, you will have to delete it yourself')
-            return value
-    else:
-        logging.info(f'{HIGHSCORE_TXT} does exist, reading data from it')
-        with open(HIGHSCORE_TXT, 'rb') as f:
-            value = pickle.load(f)
-        if isinstance(value, dict):
-            logging.info(f'{HIGHSCORE_TXT} successfully read')
-            return value
-        else:
-            logging.info(f'{HIGHSCORE_TXT} contains invalid data: {value}')
-            messagebox.showerror('Highscore value invalide', 'The highscore file contains an invalid value, press OK to delete the content of it')
-            logging.info('Removing file...')
-            os.remove(HIGHSCORE_TXT)
-            return float('inf')
+def warm_board_pool(*_):
+    """Has boards made ahead of time for the game the player is setting up"""
+    grid_size = difficulty.get()
+    if grid_size == (None, None) or grid_size == ('None', 'None'):
+        return
+    if grid_size[0] * grid_size[1] > CHUNKED_BOARD_SQUARES:
+        return
+    board_pool.want(grid_size, mines.get(), no_guess_state.get())
 
 
 def change_theme(*_):
@@ -555,7 +452,7 @@ def change_theme(*_):
                     child2.change_bg_fg(bg=CURRENT_BG, fg=CURRENT_FG)
                 elif isinstance(child2, Frame):
                     for square in child2.winfo_children():
-                        if isinstance(square, Square):
+                        if isinstance(square, SquareCanvas):
                             square.switch_theme()
                         elif isinstance(square, Label):
                             square.config(bg=CURRENT_BG, fg=CURRENT_FG)
@@ -563,13 +460,14 @@ def change_theme(*_):
 
 def show_highscores(_=None):
     logging.info('User requested highscores')
-    highscore_data = load_highscore()
+    summary = highscore_store.summary()
 
-    if isinstance(highscore_data, dict):
-        logging.info(f'Highscore data detected: {highscore_data}')
-        data = [['Game Size', 'Seconds']]
-        for key, value in highscore_data.items():
-            data.append([key, str(round(value, 1))])
+    if summary:
+        logging.info(f'Highscore data detected: {summary}')
+        data = [['Game Size', 'Best Time', 'Wins', 'Games']]
+        for rows, cols, best, wins, games in summary:
+            # Sizes that were played but never won have no best time
+            data.append([f'{rows}x{cols}', '-' if best == float('inf') else format_second(best), wins, games])
 
         new_window = Toplevel(window)
         new_window.title('Highscores')
@@ -597,11 +495,7 @@ def show_highscores(_=None):
         new_window.update()
     else:
         logging.info('No highscores found')
-        messagebox.showinfo('Highscores', 'No highscores were found, play a game and win it to get some')
-
-
-def do_nothing():
-    pass
+        messagebox.showinfo('Highscores', 'No highscores were found, play a game to get some')
 
 
 def quit_app(_=None):
@@ -610,8 +504,13 @@ def quit_app(_=None):
     logging.info('Closing Pit Mopper...')
     for code in after_cancel:
         window.after_cancel(code)
-    window.setvar('button pressed', 39393)
+    # Games that are still open are recovered the next time Pit Mopper starts
+    for game_journal in open_journals:
+        game_journal.close()
     window.destroy()
+    highscore_store.close()
+    board_pool.close()
+    no_guess.shutdown()
     logging.shutdown()
     if del_data == 'all':
         try:
@@ -624,17 +523,33 @@ def quit_app(_=None):
         except FileNotFoundError:
             pass
     elif del_data == 'highscore':
-        try:
-            os.remove(HIGHSCORE_TXT)
-        except FileNotFoundError:
-            pass
+        delete_database()
     del window
     sys.exit()
 
 
+def recover_games():
+    games = journal.find_games()
+    if not games:
+        return
+    logging.info(f'Found games to recover: {games}')
+    if messagebox.askyesno('Recover Game', 'Pit Mopper was closed while a game was being played, do you want to continue it?'):
+        try:
+            data = journal.recover(games[0])
+        except Exception as e:
+            logging.error(f'Could not recover game {games[0]}: {e}')
+            messagebox.showerror('Recover Game', 'The game could not be recovered')
+        else:
+            logging.info(f'Recovered game {games[0]}')
+            open_game(data)
+    for game_id in games:
+        journal.delete_game(game_id)
+
+
 def change_mines():
     mines_counter.set(f'Your game will have {mines.get()} mines')
     logging.info(f'Setting custom mine count: {mines.get()}')
+    warm_board_pool()
 
 
 def clear_all_data():
@@ -708,104 +623,114 @@ Full Traceback:
     webbrowser.open('https://github.com/username121546434/pit-mopper/issues')
 
 
-logging.info('Functions successfully defined, creating GUI')
-
-window = Tk()
-window.title('Game Loader')
-window.iconbitmap(default=LOGO, bitmap=LOGO)
-window.resizable(False, False)
-window.report_callback_exception = handle_exception
+if __name__ == '__main__':
+    logging.info('Functions successfully defined, creating GUI')
 
-after_cancel = []
-del_data = 'none'
+    window = Tk()
+    window.title('Game Loader')
+    window.iconbitmap(default=LOGO, bitmap=LOGO)
+    window.resizable(False, False)
+    window.report_callback_exception = handle_exception
 
-Label(text='Select Difficulty').pack(pady=(25, 0))
+    after_cancel = set()
+    open_journals = set()
+    highscore_store = HighscoreStore()
+    board_pool = BoardPool()
+    board_pool.start()
+    del_data = 'none'
 
-# Variable to hold on to which radio button value is checked.
-difficulty = Variable(window, (None, None))
+    Label(text='Select Difficulty').pack(pady=(25, 0))
 
-Radiobutton(
-    text="Easy", value=(10, 10), variable=difficulty, command=change_difficulty
-).pack()
+    # Variable to hold on to which radio button value is checked.
+    difficulty = Variable(window, (None, None))
 
-Radiobutton(
-    text="Medium", value=(20, 20), variable=difficulty, command=change_difficulty
-).pack()
+    Radiobutton(
+        text="Easy", value=(10, 10), variable=difficulty, command=change_difficulty
+    ).pack()
 
-Radiobutton(
-    text='Hard', value=(30, 30), variable=difficulty, command=change_difficulty
-).pack()
+    Radiobutton(
+        text="Medium", value=(20, 20), variable=difficulty, command=change_difficulty
+    ).pack()
 
-game_size = StringVar(window, f'You game size will be {difficulty.get()[0]} rows and {difficulty.get()[1]} columns')
+    Radiobutton(
+        text='Hard', value=(30, 30), variable=difficulty, command=change_difficulty
+    ).pack()
 
-Label(window, textvariable=game_size).pack()
+    game_size = StringVar(window, f'You game size will be {difficulty.get()[0]} rows and {difficulty.get()[1]} columns')
 
-cols = IntVar(window)
-rows = IntVar(window)
+    Label(window, textvariable=game_size).pack()
 
-Spinbox(window, from_=MIN_ROWS_AND_COLS, to=MAX_ROWS_AND_COLS, textvariable=rows, width=4, command=partial(change_difficulty, True)).pack()
-Spinbox(window, from_=MIN_ROWS_AND_COLS, to=MAX_ROWS_AND_COLS, textvariable=cols, width=4, command=partial(change_difficulty, True)).pack()
+    cols = IntVar(window)
+    rows = IntVar(window)
 
-mines = IntVar(window, -1)
+    Spinbox(window, from_=MIN_ROWS_AND_COLS, to=MAX_ROWS_AND_COLS, textvariable=rows, width=4, command=partial(change_difficulty, True)).pack()
+    Spinbox(window, from_=MIN_ROWS_AND_COLS, to=MAX_ROWS_AND_COLS, textvariable=cols, width=4, command=partial(change_difficulty, True)).pack()
 
-mines_counter = StringVar(window, f'Your game will have {mines.get()} mines')
+    mines = IntVar(window, -1)
 
-Label(window, textvariable=mines_counter).pack()
-Label(window, text='-1 means it will generate a random number/use default').pack(padx=20)
+    mines_counter = StringVar(window, f'Your game will have {mines.get()} mines')
 
-Spinbox(window, textvariable=mines, width=4, from_= -1, to = 2000, command=change_mines).pack()
+    Label(window, textvariable=mines_counter).pack()
+    Label(window, text='-1 means it will generate a random number/use default').pack(padx=20)
 
-chord_state = BooleanVar(window)
-console_open = BooleanVar(window, False)
-console_open.trace('w', console)
-dark_mode_state = BooleanVar(window)
-dark_mode_state.trace('w', change_theme)  
+    Spinbox(window, textvariable=mines, width=4, from_= -1, to = 2000, command=change_mines).pack()
 
-Button(window, text='Play!', command=create_game).pack(pady=(0, 20))
+    chord_state = BooleanVar(window)
+    no_guess_state = BooleanVar(window)
+    no_guess_state.trace('w', warm_board_pool)
+    console_open = BooleanVar(window, False)
+    console_open.trace('w', console)
+    dark_mode_state = BooleanVar(window)
+    dark_mode_state.trace('w', change_theme)  
 
-# create a menubar
-menubar = CustomMenuBar(window)
-menubar.place(x=0, y=0)
+    Button(window, text='Play!', command=create_game).pack(pady=(0, 20))
 
-# create the file_menu
-file_menu = Menu(
-    menubar,
-    tearoff=0
-)
-file_menu.add_command(label='Open File', command=load_game, accelerator='Ctrl+O')
-file_menu.add_command(label='Highscores', command=show_highscores, accelerator='Ctrl+H')
-file_menu.add_separator()
-file_menu.add_command(label='Exit', command=quit_app, accelerator='Ctrl+Q')
-
-settings = Menu(menubar, tearoff=0)
-settings.add_checkbutton(variable=chord_state, label='Enable Chording', accelerator='Ctrl+A')
-settings.add_checkbutton(variable=dark_mode_state, label='Dark Mode', accelerator='Ctrl+D')
-settings.add_separator()
-settings.add_command(label='Check for Updates', command=partial(check_for_updates, __version__, window), accelerator='Ctrl+U')
-settings.add_command(label='Version Info', command=partial(messagebox.showinfo, title='Version Info', message=f'Pit Mopper Version: {__version__}'), accelerator='Ctrl+I')
-settings.add_separator()
-settings.add_command(label='Delete all data', command=clear_all_data)
-settings.add_command(label='Delete Debug Logs', command=clear_debug)
-settings.add_command(label='Delete Highscore', command=clear_highscore)
-
-advanced = Menu(settings, tearoff=0)
-advanced.add_checkbutton(label='Console', variable=console_open, accelerator='Ctrl+X')
+    # create a menubar
+    menubar = CustomMenuBar(window)
+    menubar.place(x=0, y=0)
 
-# Keyboard Shortcuts
-window.bind_all('<Control-i>', lambda _: messagebox.showinfo(title='Version Info', message=f'Pit Mopper Version: {__version__}'))
-window.bind_all('<Control-u>', lambda _: check_for_updates(__version__, window))
-window.bind_all('<Control-q>', quit_app)
-window.bind_all('<Control-o>', load_game)
-window.bind_all('<space>', create_game)
-window.bind_all('<Control-a>', lambda _: chord_state.set(not chord_state.get()))
-window.bind_all('<Control-d>', lambda _: dark_mode_state.set(not dark_mode_state.get()))
-window.bind_all('<Control-h>', show_highscores)
-window.bind_all('<Control-x>', lambda _: console_open.set(not console_open.get()))
+    # create the file_menu
+    file_menu = Menu(
+        menubar,
+        tearoff=0
+    )
+    file_menu.add_command(label='Open File', command=load_game, accelerator='Ctrl+O')
+    file_menu.add_command(label='Highscores', command=show_highscores, accelerator='Ctrl+H')
+    file_menu.add_separator()
+    file_menu.add_command(label='Exit', command=quit_app, accelerator='Ctrl+Q')
+
+    settings = Menu(menubar, tearoff=0)
+    settings.add_checkbutton(variable=chord_state, label='Enable Chording', accelerator='Ctrl+A')
+    settings.add_checkbutton(variable=no_guess_state, label='No Guessing', accelerator='Ctrl+G')
+    settings.add_checkbutton(variable=dark_mode_state, label='Dark Mode', accelerator='Ctrl+D')
+    settings.add_separator()
+    settings.add_command(label='Check for Updates', command=partial(check_for_updates, __version__, window), accelerator='Ctrl+U')
+    settings.add_command(label='Version Info', command=partial(messagebox.showinfo, title='Version Info', message=f'Pit Mopper Version: {__version__}'), accelerator='Ctrl+I')
+    settings.add_separator()
+    settings.add_command(label='Delete all data', command=clear_all_data)
+    settings.add_command(label='Delete Debug Logs', command=clear_debug)
+    settings.add_command(label='Delete Highscore', command=clear_highscore)
+
+    advanced = Menu(settings, tearoff=0)
+    advanced.add_checkbutton(label='Console', variable=console_open, accelerator='Ctrl+X')
+
+    # Keyboard Shortcuts
+    window.bind_all('<Control-i>', lambda _: messagebox.showinfo(title='Version Info', message=f'Pit Mopper Version: {__version__}'))
+    window.bind_all('<Control-u>', lambda _: check_for_updates(__version__, window))
+    window.bind_all('<Control-q>', quit_app)
+    window.bind_all('<Control-o>', load_game)
+    window.bind_all('<space>', create_game)
+    window.bind_all('<Control-a>', lambda _: chord_state.set(not chord_state.get()))
+    window.bind_all('<Control-g>', lambda _: no_guess_state.set(not no_guess_state.get()))
+    window.bind_all('<Control-d>', lambda _: dark_mode_state.set(not dark_mode_state.get()))
+    window.bind_all('<Control-h>', show_highscores)
+    window.bind_all('<Control-x>', lambda _: console_open.set(not console_open.get()))
 
-menubar.add_menu(menu=file_menu, title='File')
-menubar.add_menu(menu=settings, title='Settings')
-menubar.add_menu(menu=advanced, title='Advanced')
-window.protocol('WM_DELETE_WINDOW', quit_app)
+    menubar.add_menu(menu=file_menu, title='File')
+    menubar.add_menu(menu=settings, title='Settings')
+    menubar.add_menu(menu=advanced, title='Advanced')
+    window.protocol('WM_DELETE_WINDOW', quit_app)
 
-logging.info('GUI successfully created')
-window.mainloop()
+    logging.info('GUI successfully created')
+    window.after_idle(recover_games)
+    window.mainloop()
@@ -0,0 +1,292 @@
+import random
+from array import array
+from collections import deque
+from functools import lru_cache
+from itertools import compress
+
+
+def default_mines(grid_size: tuple[int, int]) -> int:
+    """Returns the number of mines used when the player leaves the mine count at -1"""
+    if grid_size == (10, 10):
+        return 10
+    elif grid_size == (20, 20):
+        return 50
+    elif grid_size == (30, 30):
+        return 150
+    else:
+        return int((grid_size[0] * grid_size[1])/9)
+
+
+@lru_cache(maxsize=8)
+def neighbor_table(rows: int, cols: int) -> tuple[array, array]:
+    """Returns `(offsets, around)` where the squares around square `i` are
+    `around[offsets[i]:offsets[i + 1]]`.
+
+    The table only depends on the size of the board so it is shared by every game of that size
+    """
+    offsets = array('I', [0])
+    around = array('I')
+    for row in range(rows):
+        row_start = max(row - 1, 0)
+        row_stop = min(row + 2, rows)
+        for col in range(cols):
+            for row2 in range(row_start, row_stop):
+                for col2 in range(max(col - 1, 0), min(col + 2, cols)):
+                    if row2 != row or col2 != col:
+                        around.append(row2 * cols + col2)
+            offsets.append(len(around))
+    return offsets, around
+
+
+def count_padded(padded: bytes, width: int) -> bytes:
+    """Counts the mines around every square of a grid of 0s and 1s with rows `width` long and a
+    border of zeros, mines get 0. The result has the same layout as `padded`.
+
+    The grid is read as one big number with a square in every byte, so shifting it by a byte or
+    by a row and adding lines every square up with its neighbors in one go. A square adds up to
+    at most 9 so nothing ever carries into the next byte
+    """
+    mines = int.from_bytes(padded, 'little')
+    across = mines + (mines << 8) + (mines >> 8)
+    around = across + (across << 8 * width) + (across >> 8 * width) - mines
+    not_mines = (1 << 8 * len(padded)) - 1 - mines * 255
+    return (around & not_mines).to_bytes(len(padded), 'little')
+
+
+def count_neighbors(mines: bytes, rows: int, cols: int) -> bytes:
+    """Returns the number of mines around every square of a plane of mines, mines get 0"""
+    width = cols + 2
+    padded = bytearray(width * (rows + 2))
+    for row in range(rows):
+        start = (row + 1) * width + 1
+        padded[start:start + cols] = mines[row * cols:(row + 1) * cols]
+    counts = count_padded(padded, width)
+    return b''.join(counts[(row + 1) * width + 1:(row + 1) * width + 1 + cols] for row in range(rows))
+
+
+class Board:
+    """The state of a Pit Mopper game without any Tk widgets.
+
+    Every cell is stored in flat arrays indexed by `row * cols + col`
+    """
+
+    def __init__(self, grid_size: tuple[int, int], num_mines: int = -1, seed: int | None = None) -> None:
+        self.grid_size = grid_size
+        self.rows, self.cols = grid_size
+        self.size = self.rows * self.cols
+        if num_mines == -1:
+            num_mines = default_mines(grid_size)
+        if not 0 < num_mines <= self.size - 9:
+            raise ValueError(f'Cannot place {num_mines} mines on a {self.rows}x{self.cols} board')
+        self.num_mines = num_mines
+        if seed == None:
+            seed = random.randrange(2**32)
+        self.seed = seed
+        self.offsets, self.around = neighbor_table(self.rows, self.cols)
+
+        self.mines = bytearray(self.size)
+        self.counts = bytearray(self.size)
+        self.revealed = bytearray(self.size)
+        self.flagged = bytearray(self.size)
+        self.chord = bytearray(self.size)
+        self.generated = False
+        self.first_click = -1
+        self.exploded = -1
+
+        # Counters kept up to date on every change so checking the game is O(1)
+        self.revealed_safe = 0
+        self.flags_placed = 0
+        self.correct_flags = 0
+
+    def index(self, row: int, col: int) -> int:
+        return row * self.cols + col
+
+    def position(self, index: int) -> tuple[int, int]:
+        return divmod(index, self.cols)
+
+    def neighbors(self, index: int) -> array:
+        return self.around[self.offsets[index]:self.offsets[index + 1]]
+
+    def generate(self, first_click: int):
+        """Places the mines, the first click and the squares around it never get a mine.
+
+        The same seed and first click always give the same board
+        """
+        not_allowed = set(self.neighbors(first_click))
+        not_allowed.add(first_click)
+        allowed = [index for index in range(self.size) if index not in not_allowed]
+
+        for index in random.Random(self.seed).sample(allowed, self.num_mines):
+            self.mines[index] = 1
+
+        self.compute_counts()
+        self.first_click = first_click
+        self.generated = True
+        self.count_correct_flags()
+
+    def use_mines(self, board: 'Board'):
+        """Takes the seed, mines and numbers of a board of the same size that was made ahead of time"""
+        self.seed = board.seed
+        self.mines[:] = board.mines
+        self.counts[:] = board.counts
+        self.first_click = board.first_click
+        self.generated = True
+        self.count_correct_flags()
+
+    def move_mines_away(self, first_click: int):
+        """Moves the mines of a board that was made for another first click out from around `first_click`.
+
+        Where they go only depends on the seed and `first_click`, so this can be done again from a journal
+        """
+        safe = set(self.neighbors(first_click))
+        safe.add(first_click)
+        mines, counts = self.mines, self.counts
+        moved = [index for index in safe if mines[index]]
+        if moved:
+            allowed = [index for index in range(self.size) if not mines[index] and index not in safe]
+            added = random.Random(f'{self.seed}:{first_click}').sample(allowed, len(moved))
+            for index in moved:
+                mines[index] = 0
+            for index in added:
+                mines[index] = 1
+                counts[index] = 0
+            # Only the numbers around the squares that changed can be different
+            changed = set()
+            for index in moved + added:
+                changed.add(index)
+                changed.update(self.neighbors(index))
+            for index in changed:
+                if not mines[index]:
+                    counts[index] = sum(mines[i] for i in self.neighbors(index))
+            self.count_correct_flags()
+        self.first_click = first_click
+
+    def compute_counts(self):
+        self.counts[:] = count_neighbors(self.mines, self.rows, self.cols)
+
+    def reveal(self, index: int) -> list[int]:
+        """Reveals a square and returns the squares that changed.
+
+        If the square is a zero, the whole area around it is opened in one go
+        """
+        if self.revealed[index] or self.flagged[index]:
+            return []
+        if not self.generated:
+            self.generate(index)
+        self.revealed[index] = 1
+        if self.mines[index]:
+            self.exploded = index
+            return [index]
+
+        changed = [index]
+        if not self.counts[index]:
+            revealed, flagged, counts = self.revealed, self.flagged, self.counts
+            offsets, around = self.offsets, self.around
+            queue = deque(changed)
+            while queue:
+                zero = queue.popleft()
+                for index2 in around[offsets[zero]:offsets[zero + 1]]:
+                    # Squares next to a zero can never be mines
+                    if not revealed[index2] and not flagged[index2]:
+                        revealed[index2] = 1
+                        changed.append(index2)
+                        if not counts[index2]:
+                            queue.append(index2)
+        self.revealed_safe += len(changed)
+        return changed
+
+    def toggle_flag(self, index: int) -> list[int]:
+        if self.revealed[index]:
+            return []
+        change = -1 if self.flagged[index] else 1
+        self.flagged[index] = change == 1
+        self.flags_placed += change
+        if self.mines[index]:
+            self.correct_flags += change
+        return [index]
+
+    def toggle_chord(self, index: int):
+        self.chord[index] = not self.chord[index]
+
+    def completed(self, index: int) -> bool:
+        """Whether all the mines around a square have been flagged"""
+        if not self.counts[index]:
+            return True
+        found = sum(1 for i in self.neighbors(index) if self.mines[i] and self.flagged[i])
+        return found == self.counts[index]
+
+    def chord_square(self, index: int) -> list[int]:
+        """Reveals every square around a completed square"""
+        changed = []
+        for i in self.neighbors(index):
+            if not self.mines[i]:
+                changed += self.reveal(i)
+        return changed
+
+    def snapshot(self) -> 'Board':
+        """Returns a copy of the board that can be saved while the game goes on"""
+        board = object.__new__(type(self))
+        board.__dict__.update(self.__dict__)
+        for name in ('mines', 'counts', 'revealed', 'flagged', 'chord'):
+            setattr(board, name, bytearray(getattr(self, name)))
+        return board
+
+    def plane_rows(self, name: str, start: int, stop: int) -> bytes:
+        """Returns one plane (ie: `'flagged'`) of rows `start` to `stop` as a copy"""
+        return bytes(getattr(self, name)[start * self.cols:stop * self.cols])
+
+    def mine_indexes(self) -> list[int]:
+        return list(compress(range(self.size), self.mines))
+
+    def flagged_indexes(self) -> list[int]:
+        return list(compress(range(self.size), self.flagged))
+
+    def revealed_indexes(self) -> list[int]:
+        return list(compress(range(self.size), self.revealed))
+
+    def three_bv(self) -> int:
+        """Returns the 3BV of the board, the fewest clicks it takes to clear it without chording"""
+        mines, counts = self.mines, self.counts
+        offsets, around = self.offsets, self.around
+        opened = bytearray(self.size)
+        clicks = 0
+        for index in range(self.size):
+            if mines[index] or counts[index] or opened[index]:
+                continue
+            # Every area of zeros is one click
+            clicks += 1
+            opened[index] = 1
+            queue = deque([index])
+            while queue:
+                zero = queue.popleft()
+                for index2 in around[offsets[zero]:offsets[zero + 1]]:
+                    if not opened[index2]:
+                        opened[index2] = 1
+                        if not counts[index2]:
+                            queue.append(index2)
+        # Numbers that are not next to a zero need a click each
+        return clicks + sum(1 for index in range(self.size) if not mines[index] and not opened[index])
+
+    def is_clicked(self, index: int) -> bool:
+        return bool(self.revealed[index] or self.flagged[index])
+
+    def count_correct_flags(self):
+        """Counts the flags on mines again after the mines changed, flags placed before that were checked against the old mines"""
+        self.correct_flags = sum(self.mines[index] for index in self.flagged_indexes())
+
+    def recount(self):
+        """Recalculates the counters after the planes were filled in directly, ie: when loading a game"""
+        flagged = self.flagged_indexes()
+        self.flags_placed = len(flagged)
+        self.correct_flags = sum(self.mines[index] for index in flagged)
+        self.revealed_safe = sum(1 for index in self.revealed_indexes() if not self.mines[index])
+
+    @property
+    def clicked_count(self) -> int:
+        return self.revealed_safe + (self.exploded != -1) + self.flags_placed
+
+    def is_won(self) -> bool:
+        return self.exploded == -1 and self.revealed_safe == self.size - self.num_mines
+
+    def is_lost(self) -> bool:
+        return self.exploded != -1
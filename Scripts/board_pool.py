@@ -0,0 +1,143 @@
+"""Keeps a few boards ready for the game sizes the player is about to play.
+
+Boards are made on a background thread with the center as their first click, no guessing
+boards use `no_guess.find_seed` which spreads the search over its process pool. When the
+first click comes, a pooled board has its mines moved away from the square that was clicked
+(see `Board.move_mines_away`).
+
+A no guessing board is only proven to be clearable from the center, so it is kept with the
+empty squares the center opens. Clicking any of them opens the same squares, so the board can
+be used without moving mines or solving it again. If the first click misses every pooled
+board, the oldest one is dropped and the search for the pool is stopped so the game's own search
+gets the process pool to itself. The game calls `resume` when its search is done.
+
+A pooled board is still made from its seed, the journal records the seed and a `POOLED`
+move so a recovered game gets the same board.
+"""
+import logging
+from collections import deque
+from threading import Event, Lock, Thread
+from .board import Board, default_mines
+from . import no_guess
+
+# Boards kept ready for every game size that is wanted
+POOL_SIZE = 3
+# Seconds the pool searches for a no guessing board before it waits to be woken up again
+SEARCH_SECONDS = 60
+
+
+def pool_click(grid_size: tuple[int, int]) -> int:
+    """The first click pooled boards are made for"""
+    return (grid_size[0] // 2) * grid_size[1] + grid_size[1] // 2
+
+
+def opening(board: Board, first_click: int) -> frozenset[int]:
+    """The empty squares `first_click` opens, clicking any of them opens the same squares"""
+    board = board.snapshot()
+    return frozenset(index for index in board.reveal(first_click) if not board.counts[index])
+
+
+class BoardPool(Thread):
+    def __init__(self, size: int = POOL_SIZE) -> None:
+        super().__init__(daemon=True)
+        self.size = size
+        # `(grid_size, num_mines, no_guessing)` to the boards that are ready for it, and the first
+        # clicks no guessing boards are proven to be clearable from
+        self.boards: dict[tuple[tuple[int, int], int, bool], deque[tuple[Board, frozenset[int]]]] = {}
+        self.lock = Lock()
+        self.wake = Event()
+        # Stops the search for a no guessing board that is running
+        self.stop = Event()
+        self.closed = False
+
+    def key(self, grid_size: tuple[int, int], num_mines: int, no_guessing: bool) -> tuple[tuple[int, int], int, bool]:
+        if num_mines == -1:
+            num_mines = default_mines(grid_size)
+        return tuple(grid_size), num_mines, no_guessing
+
+    def want(self, grid_size: tuple[int, int], num_mines: int, no_guessing: bool):
+        """Starts keeping boards ready for a game size, the sizes that were wanted before are dropped"""
+        key = self.key(grid_size, num_mines, no_guessing)
+        with self.lock:
+            if key not in self.boards:
+                # The board being searched for is not wanted anymore
+                self.stop.set()
+            # Only the last size the player picked is likely to be played
+            self.boards = {key: self.boards.get(key, deque())}
+        self.wake.set()
+
+    def take(self, grid_size: tuple[int, int], num_mines: int, no_guessing: bool, first_click: int) -> Board | None:
+        """Returns a ready board that is safe around `first_click`, or `None` if there is none"""
+        key = self.key(grid_size, num_mines, no_guessing)
+        with self.lock:
+            boards = self.boards.get(key)
+            if not boards:
+                if no_guessing:
+                    # The game searches for a board itself now, and needs the process pool for it
+                    self.stop.set()
+                return None
+            if not no_guessing:
+                pooled = boards[0]
+            else:
+                pooled = next((pooled for pooled in boards if first_click in pooled[1]), None)
+                if pooled == None:
+                    logging.info('No pooled board is proven clearable from this first click, making a new one')
+                    boards.popleft()
+                    self.stop.set()
+                    return None
+            boards.remove(pooled)
+        board = pooled[0]
+        self.wake.set()
+        board.move_mines_away(first_click)
+        return board
+
+    def needed(self) -> tuple[tuple[tuple[int, int], int, bool], deque[tuple[Board, frozenset[int]]]] | None:
+        with self.lock:
+            for key, boards in self.boards.items():
+                if len(boards) < self.size:
+                    return key, boards
+        return None
+
+    def run(self):
+        while not self.closed:
+            self.wake.clear()
+            self.stop.clear()
+            needed = self.needed()
+            if needed == None:
+                self.wake.wait()
+                continue
+            key, boards = needed
+            grid_size, num_mines, no_guessing = key
+            try:
+                pooled = self.make(grid_size, num_mines, no_guessing)
+            except Exception as e:
+                logging.error(f'Could not make a board for {key}: {e}')
+                pooled = None
+            if pooled == None:
+                # Wait for another size to be wanted or a board to be taken before trying again
+                self.wake.wait()
+                continue
+            with self.lock:
+                boards.append(pooled)
+
+    def make(self, grid_size: tuple[int, int], num_mines: int, no_guessing: bool) -> tuple[Board, frozenset[int]] | None:
+        board = Board(grid_size, num_mines)
+        click = pool_click(grid_size)
+        if not no_guessing:
+            board.generate(click)
+            return board, frozenset()
+        seed = no_guess.find_seed(board, click, self.stop, SEARCH_SECONDS)
+        if seed == None:
+            return None
+        board.seed = seed
+        board.generate(click)
+        return board, opening(board, click)
+
+    def resume(self):
+        """Goes back to making boards after `take` stopped it for the game's own search"""
+        self.wake.set()
+
+    def close(self):
+        self.closed = True
+        self.stop.set()
+        self.wake.set()
@@ -0,0 +1,334 @@
+import random
+from collections import deque
+from .board import Board, count_padded
+
+CHUNK_SIZE = 64
+CHUNK_AREA = CHUNK_SIZE * CHUNK_SIZE
+
+
+class Chunk:
+    """A `CHUNK_SIZE` by `CHUNK_SIZE` part of a `ChunkedBoard`, indexed by `row * CHUNK_SIZE + col`"""
+
+    def __init__(self) -> None:
+        self.mines: bytearray | None = None
+        self.counts: bytearray | None = None
+        self.revealed = bytearray(CHUNK_AREA)
+        self.flagged = bytearray(CHUNK_AREA)
+        self.chord = bytearray(CHUNK_AREA)
+
+
+class ChunkPlane:
+    """Lets one plane of a `ChunkedBoard` be read and written by flat index, like the planes of `Board`"""
+
+    def __init__(self, board: 'ChunkedBoard', name: str) -> None:
+        self.board = board
+        self.name = name
+
+    def __getitem__(self, index: int) -> int:
+        key, local = self.board.locate(index)
+        if self.name == 'mines':
+            return self.board.chunk_mines(key)[local]
+        elif self.name == 'counts':
+            return self.board.chunk_counts(key)[local]
+        chunk = self.board.chunks.get(key)
+        if chunk == None:
+            if self.board.source == None:
+                return 0
+            chunk = self.board.chunk(key)
+        return getattr(chunk, self.name)[local]
+
+    def __setitem__(self, index: int, value):
+        key, local = self.board.locate(index)
+        getattr(self.board.chunk(key), self.name)[local] = value
+
+
+class ChunkedBoard(Board):
+    """A board that is only made where it is played.
+
+    The mines and numbers of a chunk are made the first time the chunk is looked at, from a
+    seed that only depends on the board seed and where the chunk is. The first click costs
+    the same on any board size and memory only grows with the chunks that were touched.
+    """
+
+    def __init__(self, grid_size: tuple[int, int], num_mines: int = -1, seed: int | None = None) -> None:
+        self.grid_size = grid_size
+        self.rows, self.cols = grid_size
+        self.size = self.rows * self.cols
+        if num_mines == -1:
+            num_mines = self.size // 9
+        if not 0 < num_mines <= self.size - 9:
+            raise ValueError(f'Cannot place {num_mines} mines on a {self.rows}x{self.cols} board')
+        self.requested_mines = num_mines
+        self.density = num_mines / self.size
+        if seed == None:
+            seed = random.randrange(2**32)
+        self.seed = seed
+        self.chunk_rows = -(-self.rows // CHUNK_SIZE)
+        self.chunk_cols = -(-self.cols // CHUNK_SIZE)
+        # Every chunk gets a fixed number of mines so the total is known before anything is made
+        self.num_mines = sum(
+            self.chunk_mine_count((chunk_row, chunk_col))
+            for chunk_row in range(self.chunk_rows)
+            for chunk_col in range(self.chunk_cols)
+        )
+
+        self.chunks: dict[tuple[int, int], Chunk] = {}
+        # A `MappedPlanes` when the board was opened from a file, chunks are decoded from it when they are made
+        self.source = None
+        self.safe: set[int] = set()
+        self.mines = ChunkPlane(self, 'mines')
+        self.counts = ChunkPlane(self, 'counts')
+        self.revealed = ChunkPlane(self, 'revealed')
+        self.flagged = ChunkPlane(self, 'flagged')
+        self.chord = ChunkPlane(self, 'chord')
+        self.generated = False
+        self.first_click = -1
+        self.exploded = -1
+
+        self.revealed_safe = 0
+        self.flags_placed = 0
+        self.correct_flags = 0
+
+    def locate(self, index: int) -> tuple[tuple[int, int], int]:
+        """Returns the chunk a square is in and where it is inside the chunk"""
+        row, col = divmod(index, self.cols)
+        chunk_row, local_row = divmod(row, CHUNK_SIZE)
+        chunk_col, local_col = divmod(col, CHUNK_SIZE)
+        return (chunk_row, chunk_col), local_row * CHUNK_SIZE + local_col
+
+    def chunk_shape(self, key: tuple[int, int]) -> tuple[int, int]:
+        """Returns the number of rows and columns of a chunk that are on the board"""
+        return (
+            min(CHUNK_SIZE, self.rows - key[0] * CHUNK_SIZE),
+            min(CHUNK_SIZE, self.cols - key[1] * CHUNK_SIZE)
+        )
+
+    def chunk_mine_count(self, key: tuple[int, int]) -> int:
+        rows, cols = self.chunk_shape(key)
+        area = rows * cols
+        # 9 squares are left free in case the first click is in this chunk
+        return max(min(round(area * self.density), area - 9), 0)
+
+    def chunk(self, key: tuple[int, int]) -> Chunk:
+        chunk = self.chunks.get(key)
+        if chunk == None:
+            chunk = self.chunks[key] = Chunk()
+            if self.source != None:
+                self.load_chunk(key, chunk)
+        return chunk
+
+    def load_chunk(self, key: tuple[int, int], chunk: Chunk):
+        rows, cols = self.chunk_shape(key)
+        top = key[0] * CHUNK_SIZE
+        left = key[1] * CHUNK_SIZE
+        for name in ('revealed', 'flagged', 'chord'):
+            plane = getattr(chunk, name)
+            for row in range(rows):
+                plane[row * CHUNK_SIZE:row * CHUNK_SIZE + cols] = self.source.read(name, top + row, left, cols)
+
+    def load_source(self):
+        """Loads every chunk the file has something in, then stops reading from the file"""
+        if self.source == None:
+            return
+        for name in ('revealed', 'flagged', 'chord'):
+            for index in self.source.nonzero(name):
+                # A byte of the file holds 8 squares, which can be in two chunks
+                for square in range(index, min(index + 8, self.size)):
+                    self.chunk(self.locate(square)[0])
+        self.close_source()
+
+    def close_source(self):
+        if self.source != None:
+            self.source.close()
+            self.source = None
+
+    def chunk_mines(self, key: tuple[int, int]) -> bytearray:
+        if not self.generated:
+            return bytes(CHUNK_AREA)
+        chunk = self.chunk(key)
+        if chunk.mines == None:
+            chunk.mines = self.place_chunk_mines(key)
+        return chunk.mines
+
+    def place_chunk_mines(self, key: tuple[int, int]) -> bytearray:
+        rows, cols = self.chunk_shape(key)
+        top = key[0] * CHUNK_SIZE
+        left = key[1] * CHUNK_SIZE
+        allowed = [
+            row * CHUNK_SIZE + col
+            for row in range(rows)
+            for col in range(cols)
+            if (top + row) * self.cols + left + col not in self.safe
+        ]
+        mines = bytearray(CHUNK_AREA)
+        rng = random.Random(f'{self.seed}:{key[0]}:{key[1]}')
+        for local in rng.sample(allowed, self.chunk_mine_count(key)):
+            mines[local] = 1
+        return mines
+
+    def chunk_counts(self, key: tuple[int, int]) -> bytearray:
+        chunk = self.chunk(key)
+        if chunk.counts == None:
+            chunk.counts = self.compute_chunk_counts(key)
+        return chunk.counts
+
+    def compute_chunk_counts(self, key: tuple[int, int]) -> bytearray:
+        """Counts the mines around each square of a chunk, looking into the chunks next to it for the edges"""
+        width = CHUNK_SIZE + 2
+        padded = bytearray(width * width)
+        chunk_row, chunk_col = key
+        last = CHUNK_SIZE - 1
+        for row_step in (-1, 0, 1):
+            for col_step in (-1, 0, 1):
+                other = (chunk_row + row_step, chunk_col + col_step)
+                if not (0 <= other[0] < self.chunk_rows and 0 <= other[1] < self.chunk_cols):
+                    continue
+                mines = self.chunk_mines(other)
+                # Copy the part of the other chunk that touches this one into the padded grid
+                rows = range(CHUNK_SIZE) if row_step == 0 else [last if row_step == -1 else 0]
+                cols = range(CHUNK_SIZE) if col_step == 0 else [last if col_step == -1 else 0]
+                for row in rows:
+                    padded_row = row + 1 + row_step * CHUNK_SIZE
+                    if len(cols) == CHUNK_SIZE:
+                        start = padded_row * width + 1
+                        padded[start:start + CHUNK_SIZE] = mines[row * CHUNK_SIZE:(row + 1) * CHUNK_SIZE]
+                    else:
+                        col = cols[0]
+                        padded[padded_row * width + col + 1 + col_step * CHUNK_SIZE] = mines[row * CHUNK_SIZE + col]
+
+        around = count_padded(padded, width)
+        counts = bytearray(CHUNK_AREA)
+        rows, cols = self.chunk_shape(key)
+        for row in range(rows):
+            start = (row + 1) * width + 1
+            counts[row * CHUNK_SIZE:row * CHUNK_SIZE + cols] = around[start:start + cols]
+        return counts
+
+    def neighbors(self, index: int) -> list[int]:
+        row, col = divmod(index, self.cols)
+        around = []
+        for row2 in range(max(row - 1, 0), min(row + 2, self.rows)):
+            for col2 in range(max(col - 1, 0), min(col + 2, self.cols)):
+                if row2 != row or col2 != col:
+                    around.append(row2 * self.cols + col2)
+        return around
+
+    def generate(self, first_click: int):
+        """Remembers where the first click was, the mines are placed chunk by chunk when they are needed"""
+        self.safe = set(self.neighbors(first_click))
+        self.safe.add(first_click)
+        self.first_click = first_click
+        self.generated = True
+        self.count_correct_flags()
+
+    def reveal(self, index: int) -> list[int]:
+        if self.revealed[index] or self.flagged[index]:
+            return []
+        if not self.generated:
+            self.generate(index)
+        self.revealed[index] = 1
+        if self.mines[index]:
+            self.exploded = index
+            return [index]
+
+        changed = [index]
+        if not self.counts[index]:
+            revealed, flagged, counts = self.revealed, self.flagged, self.counts
+            queue = deque(changed)
+            while queue:
+                zero = queue.popleft()
+                for index2 in self.neighbors(zero):
+                    if not revealed[index2] and not flagged[index2]:
+                        revealed[index2] = 1
+                        changed.append(index2)
+                        if not counts[index2]:
+                            queue.append(index2)
+        self.revealed_safe += len(changed)
+        return changed
+
+    def snapshot(self) -> 'ChunkedBoard':
+        """Returns a copy of the board that can be saved while the game goes on, only made chunks are copied"""
+        board = object.__new__(type(self))
+        board.__dict__.update(self.__dict__)
+        board.chunks = {}
+        for key, chunk in self.chunks.items():
+            copy = Chunk()
+            copy.mines = chunk.mines
+            copy.counts = chunk.counts
+            copy.revealed[:] = chunk.revealed
+            copy.flagged[:] = chunk.flagged
+            copy.chord[:] = chunk.chord
+            board.chunks[key] = copy
+        for name in ('mines', 'counts', 'revealed', 'flagged', 'chord'):
+            setattr(board, name, ChunkPlane(board, name))
+        if self.source != None:
+            # The copy is closed when it is done with, which must not close the file for the game
+            board.source = self.source.reopen()
+        return board
+
+    def plane_rows(self, name: str, start: int, stop: int) -> bytes:
+        """Returns one plane of rows `start` to `stop`, chunks that were never made are all zeros"""
+        rows = []
+        made = {}
+        for row in range(start, stop):
+            chunk_row, local_row = divmod(row, CHUNK_SIZE)
+            if chunk_row not in made:
+                made[chunk_row] = [
+                    (key[1] * CHUNK_SIZE, self.chunk_shape(key)[1], getattr(chunk, name))
+                    for key, chunk in self.chunks.items()
+                    if key[0] == chunk_row and getattr(chunk, name) != None
+                ]
+            if self.source != None and name != 'mines':
+                # Whole rows are read from the file at once and the made chunks are put over them
+                line = bytearray(self.source.read(name, row, 0, self.cols))
+            else:
+                line = bytearray(self.cols)
+            for left, width, plane in made[chunk_row]:
+                line[left:left + width] = plane[local_row * CHUNK_SIZE:local_row * CHUNK_SIZE + width]
+            rows.append(line)
+        return b''.join(rows)
+
+    def made_rows(self, start: int, stop: int) -> bool:
+        """Whether a chunk was made anywhere in rows `start` to `stop`"""
+        first = start // CHUNK_SIZE
+        last = -(-stop // CHUNK_SIZE)
+        return any(first <= chunk_row < last for chunk_row, _ in self.chunks)
+
+    def three_bv(self) -> int | None:
+        """Chunked boards are never fully made, so they do not have a 3BV"""
+        return None
+
+    def chunk_indexes(self, name: str) -> list[int]:
+        """Returns every square that is set in a plane, only looking at chunks that were made"""
+        indexes = []
+        for key, chunk in self.chunks.items():
+            plane = getattr(chunk, name)
+            if plane == None:
+                continue
+            top = key[0] * CHUNK_SIZE
+            left = key[1] * CHUNK_SIZE
+            for local, value in enumerate(plane):
+                if value:
+                    row, col = divmod(local, CHUNK_SIZE)
+                    indexes.append((top + row) * self.cols + left + col)
+        return indexes
+
+    def made_indexes(self) -> list[int]:
+        """Returns every square of the chunks that were made"""
+        indexes = []
+        for key in list(self.chunks):
+            rows, cols = self.chunk_shape(key)
+            top = key[0] * CHUNK_SIZE
+            left = key[1] * CHUNK_SIZE
+            for row in range(top, top + rows):
+                indexes.extend(range(row * self.cols + left, row * self.cols + left + cols))
+        return indexes
+
+    def mine_indexes(self) -> list[int]:
+        return self.chunk_indexes('mines')
+
+    def flagged_indexes(self) -> list[int]:
+        return self.chunk_indexes('flagged')
+
+    def revealed_indexes(self) -> list[int]:
+        return self.chunk_indexes('revealed')
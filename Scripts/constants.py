@@ -7,9 +7,16 @@ SW_HIDE = 0
 SW_SHOW = 5
 STRFTIME = r'%A %B %d, %I:%M %p %Y %Z'
 HIGHSCORE_TXT = os.path.join(APPDATA, 'highscore.txt')
+HIGHSCORE_DB = os.path.join(APPDATA, 'highscores.db')
+AUTOSAVE = os.path.join(APPDATA, 'autosave')
 LOGO = "data\\images\\logo.ico"
-MAX_ROWS_AND_COLS = 75
+MAX_ROWS_AND_COLS = 10000
+CHUNKED_BOARD_SQUARES = 250000
 MIN_ROWS_AND_COLS = 4
+SQUARE_SIZE = 30
+MIN_SQUARE_SIZE = 8
+READABLE_SQUARE_SIZE = 16
+MAX_SQUARE_SIZE = 60
 DARK_MODE_BG = '#282828'
 DARK_MODE_FG = '#FFFFFF'
 DEFAULT_BG = '#f0f0f0f0f0f0'
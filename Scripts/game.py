@@ -1,22 +1,100 @@
+import secrets
+from collections import deque
 from datetime import datetime
+from .board import Board
+from .journal import REVEAL, FLAG, CHORD
+from . import protocol
+
+# Deltas kept for every player so a client that reconnects can catch up without a snapshot
+MAX_HISTORY = 256
 
 
 class OnlineGame:
-    def __init__(self, id) -> None:
+    """A multiplayer game, the server owns the boards and the players only send moves.
+
+    Both players get a board with the same size, mines and seed. Every move that changes a
+    board gives a delta with the next sequence number of that board, the last `MAX_HISTORY`
+    deltas are kept so a client can catch up from the last sequence number it saw
+    """
+
+    def __init__(self, id, grid_size: tuple[int, int] = (10, 10), num_mines: int = -1, seed: int | None = None) -> None:
         self.id = id
         self.p2_name = ''
         self.p1_name = ''
         self.p1_finished = False
         self.p2_finished = False
-        self.p1_info = {}
-        self.p2_info = {}
-    
-    def update_info(self, player:int, info:dict):
+        self.boards = {1: Board(grid_size, num_mines, seed)}
+        self.boards[2] = Board(grid_size, self.boards[1].num_mines, self.boards[1].seed)
+        self.grid_size = grid_size
+        self.num_mines = self.boards[1].num_mines
+        self.sequence = {1: 0, 2: 0}
+        self.history: dict[int, deque[tuple[int, bytes]]] = {1: deque(maxlen=MAX_HISTORY), 2: deque(maxlen=MAX_HISTORY)}
+        # Lets a player that lost their connection take their place back
+        self.tokens = {1: secrets.token_bytes(8), 2: secrets.token_bytes(8)}
+        self.start = datetime.now()
+
+    def set_name(self, player: int, name: str):
         if player == 1:
-            self.p1_info = info
+            self.p1_name = name
         else:
-            self.p2_info = info
-    
+            self.p2_name = name
+
+    def finished(self, player: int) -> datetime | bool:
+        return self.p1_finished if player == 1 else self.p2_finished
+
     def both_finished(self):
         return isinstance(self.p1_finished, datetime) and isinstance(self.p2_finished, datetime)
 
+    def play(self, player: int, moves: list[tuple[int, int]]) -> bytes | None:
+        """Does the moves a player sent and returns the delta for them, or `None` if nothing changed.
+
+        Moves that are not allowed, ie: on a square that is not on the board or after the player
+        finished, are left out
+        """
+        board = self.boards[player]
+        changed = set()
+        for move, index in moves:
+            if self.finished(player) or not 0 <= index < board.size:
+                break
+            if move == REVEAL:
+                changed.update(board.reveal(index))
+            elif move == FLAG:
+                changed.update(board.toggle_flag(index))
+            elif move == CHORD:
+                if board.revealed[index] and not board.mines[index] and board.completed(index):
+                    changed.update(board.chord_square(index))
+            if board.is_won() or board.is_lost():
+                if player == 1:
+                    self.p1_finished = datetime.now()
+                else:
+                    self.p2_finished = datetime.now()
+                if board.is_lost():
+                    # The player can see where the mines were now
+                    changed.update(board.mine_indexes())
+        if not changed:
+            return None
+        return self.delta(player, changed)
+
+    def delta(self, player: int, changed) -> bytes:
+        board = self.boards[player]
+        show_mines = bool(self.finished(player))
+        self.sequence[player] += 1
+        delta = protocol.encode_delta(
+            self.sequence[player], player, board,
+            [(index, protocol.square_state(board, index, show_mines)) for index in changed]
+        )
+        self.history[player].append((self.sequence[player], delta))
+        return delta
+
+    def snapshot(self, player: int) -> bytes:
+        board = self.boards[player]
+        return protocol.encode_snapshot(board, self.sequence[player], player, bool(self.finished(player)))
+
+    def catch_up(self, player: int, sequence: int) -> list[bytes]:
+        """Returns what a client that saw up to `sequence` of a board needs to be up to date"""
+        if sequence == self.sequence[player]:
+            return []
+        history = self.history[player]
+        if history and history[0][0] <= sequence + 1 and sequence < self.sequence[player]:
+            return [delta for number, delta in history if number > sequence]
+        return [self.snapshot(player)]
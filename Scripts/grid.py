@@ -1,8 +1,13 @@
 from tkinter import *
-from Scripts.constants import APP_CLOSED
-from .squares import Square, PickleSquare
-import random
-from functools import partial
+from .squares import SquareCanvas, PickleSquare
+from .board import Board
+from .chunks import ChunkedBoard
+from .solver import Solver
+from .probability import Probabilities
+from .journal import REVEAL, FLAG, CHORD_TOGGLE, CHORD, SEED, POOLED
+from .board_pool import BoardPool
+from . import no_guess
+from .constants import SQUARE_SIZE, READABLE_SQUARE_SIZE, CHUNKED_BOARD_SQUARES
 from .base_logger import init_logger
 import logging
 init_logger()
@@ -12,186 +17,332 @@ class ButtonGrid:
     def __init__(
         self, grid_size: tuple[int, int],
         window: Toplevel,
-        grid: list[list[PickleSquare]] | None = None,
         dark_mode: bool = False,
         num_mines: int = -1,
         row: int = 2,
-        column: int = 1
+        column: int = 1,
+        board: Board | None = None,
+        seed: int | None = None,
+        no_guessing: bool = False,
+        pool: BoardPool | None = None
     ):
         self.grid_size = grid_size
         self.root = window
         self.dark_mode = dark_mode
-        self.num_mines = num_mines
-        if grid == None:
-            self.grid = self.button_grid(row, column)
-        else:
-            self.grid = self.setup_grid(grid, row, column)
+        if board == None:
+            if grid_size[0] * grid_size[1] > CHUNKED_BOARD_SQUARES:
+                logging.info(f'Board is {grid_size}, it will be made in chunks as it is played')
+                board = ChunkedBoard(grid_size, num_mines, seed)
+            else:
+                board = Board(grid_size, num_mines, seed)
+        self.board = board
+        self.num_mines = board.num_mines
+        self.chording = False
+        # Boards made in chunks are never all there, so the solver cannot check them
+        self.no_guessing = no_guessing and not isinstance(board, ChunkedBoard)
+        # Chunked boards are already made as they are played
+        self.pool = None if isinstance(board, ChunkedBoard) else pool
+        self.playing = True
+        self.on_change = None
+        # Called with every move so it can be written to the journal
+        self.on_move = None
+        # Called with a message for the player, or '' to clear it
+        self.on_status = None
+        # The no guessing search that is running after the first click
+        self.search: no_guess.SeedSearch | None = None
+        # Made the first time a hint is asked for, then kept up to date with every move
+        self.solver = None
+        self.probabilities = None
+        self.heat_map = False
+        self.heat_marked: set[int] = set()
+        self.canvas = self.button_grid(row, column)
+
+    def square_size(self) -> int:
+        """Picks the biggest square size that lets the whole board fit on the screen,
+        boards that would need squares that are too small to click get scrollbars instead"""
+        width = int(self.root.winfo_screenwidth() * 0.9) // self.grid_size[1]
+        height = int(self.root.winfo_screenheight() * 0.75) // self.grid_size[0]
+        return max(min(SQUARE_SIZE, width, height), READABLE_SQUARE_SIZE)
 
-    def button_grid(self, row_num, col_num) -> list[list[Square]]:
+    def button_grid(self, row_num, col_num) -> SquareCanvas:
         Grid.rowconfigure(self.root, row_num, weight=1)
         Grid.columnconfigure(self.root, col_num, weight=1)
-        grid = []
-        blank = "   " * 3
-        button_pressed = Variable(self.root.winfo_toplevel(), None, 'button pressed')
         # Create & Configure frame
         frame = Frame(self.root)
         frame.grid(row=2, column=1, sticky=N+S+E+W)
-        for row_index in range(self.grid_size[0]):
-            Grid.rowconfigure(frame, row_index, weight=1)
-            row = []
-            for col_index in range(self.grid_size[1]):
-                Grid.columnconfigure(frame, col_index, weight=1)
-                # create a button inside frame
-                btn = Square(master=frame, text=blank)
-                btn.grid(row=row_index, column=col_index, sticky=N+S+E+W)
-                if self.dark_mode:
-                    btn.switch_theme()
-                # Store row and column indices as a Button attribute
-                btn.position = (row_index, col_index)
-                btn.config(command=partial(button_pressed.set, btn.position))
-                row.append(btn)
-            grid.append(row)
+        Grid.rowconfigure(frame, 0, weight=1)
+        Grid.columnconfigure(frame, 0, weight=1)
+        canvas = SquareCanvas(frame, self.board, self.square_size(), self.dark_mode)
+        canvas.grid(row=0, column=0, sticky=N+S+E+W)
+        xbar = Scrollbar(frame, orient=HORIZONTAL)
+        ybar = Scrollbar(frame, orient=VERTICAL)
+        canvas.attach_scrollbars(xbar, ybar)
+        if canvas.winfo_reqwidth() < self.board.cols * canvas.square_size:
+            xbar.grid(row=1, column=0, sticky=E+W)
+        if canvas.winfo_reqheight() < self.board.rows * canvas.square_size:
+            ybar.grid(row=0, column=1, sticky=N+S)
+        canvas.bind('<Button-1>', lambda e: self.clicked(canvas.square_at(e.x, e.y)))
+        canvas.bind('<Button-2>', lambda e: self.chord_self(canvas.square_at(e.x, e.y)))
+        canvas.bind('<Button-3>', lambda e: self.flag(canvas.square_at(e.x, e.y)))
 
-
-        self.grid = grid
         logging.info('Grid Created, waiting for button press...')
-        self.root.winfo_toplevel().wait_variable('button pressed')
-        coordinates = button_pressed.get()
-        if APP_CLOSED: # Stop message
-            try:
-                self.root.destroy()
-            except TclError:
-                return
-
-        for square, _ in self.iter_squares():
-            square.config(command=None)
-        self.grid = grid
+        return canvas
+
+    def update_squares(self, indexes: list[int]):
+        self.canvas.redraw(indexes)
+
+    def place_mines(self, first_click: int) -> bool:
+        """Uses a board from the pool if there is one ready, the board is made by `Board.reveal` otherwise.
+        Returns `True` if a no guessing board is being searched for, the square is revealed when it is found"""
+        pooled = None
+        if self.pool != None:
+            pooled = self.pool.take(self.board.grid_size, self.board.num_mines, self.no_guessing, first_click)
+        if pooled != None:
+            logging.info(f'Using a board from the pool, seed: {pooled.seed}')
+            self.moved(SEED, pooled.seed)
+            self.moved(POOLED, first_click)
+            self.board.use_mines(pooled)
+        elif self.no_guessing:
+            self.pick_no_guessing_seed(first_click)
+            return True
+        return False
+
+    def pick_no_guessing_seed(self, first_click: int):
+        """Searches on a thread, nothing can be clicked until it is done"""
+        self.playing = False
+        self.search = no_guess.SeedSearch(self.board, first_click)
+        self.search.start()
+        self.status('Looking for a board that needs no guessing...')
+        self.root.after(100, self.check_search)
+
+    def check_search(self):
+        search = self.search
+        if search == None:
+            return
+        if search.is_alive():
+            self.root.after(100, self.check_search)
+            return
+        self.search = None
+        self.playing = True
+        if self.pool != None:
+            self.pool.resume()
+        if search.seed == None:
+            logging.warning(f'No board without guessing was found in {search.timeout} s, using a random board')
+            self.status(f'No board without guessing was found in {search.timeout} s, this one might need a guess')
+        else:
+            logging.info(f'Board seed for no guessing: {search.seed}')
+            self.moved(SEED, search.seed)
+            self.board.seed = search.seed
+            self.status('')
+        self.open_square(search.first_click)
+
+    def stop_search(self):
+        """Stops a no guessing search that is running, for when the game is closed"""
+        if self.search != None:
+            self.search.stop()
+            self.search = None
 
-        not_allowed_coors = [
-            coordinates
+    def status(self, message: str):
+        if self.on_status != None:
+            self.on_status(message)
+
+    def moved(self, move: int, index: int):
+        if self.on_move != None:
+            self.on_move(move, index)
+
+    def changed(self, indexes: list[int]):
+        """Redraws the squares that changed and tells the game about it"""
+        if not indexes:
+            return
+        self.update_squares(indexes)
+        if self.solver != None:
+            self.solver.update(indexes)
+        if self.heat_map:
+            self.draw_heat_map()
+        if self.on_change != None:
+            self.on_change(indexes)
+
+    def clicked(self, index: int | None):
+        if index != None:
+            self.reveal(index)
+
+    def reveal(self, index: int) -> list[int]:
+        if not self.playing:
+            return []
+        if not self.board.generated:
+            logging.info(f'First square clicked at {self.board.position(index)}, placing mines...')
+            if self.place_mines(index):
+                return []
+        return self.open_square(index)
+
+    def open_square(self, index: int) -> list[int]:
+        self.moved(REVEAL, index)
+        changed = self.board.reveal(index)
+        self.changed(changed)
+        return changed
+
+    def flag(self, index: int | None):
+        if not self.playing or index == None:
+            return
+        self.moved(FLAG, index)
+        self.changed(self.board.toggle_flag(index))
+        if self.chording:
+            # Squares that were waiting to be chorded might be completed now
+            for index2 in self.board.neighbors(index):
+                if self.board.chord[index2] and self.board.completed(index2):
+                    self.chord(index2)
+
+    def chord_self(self, index: int | None):
+        if not self.playing or not self.chording or index == None:
+            return
+        self.moved(CHORD_TOGGLE, index)
+        self.board.toggle_chord(index)
+        if not self.board.chord[index]:
+            return
+        if self.board.completed(index):
+            self.chord(index)
+        else:
+            self.show_chord(index)
+
+    def chord(self, index: int):
+        self.moved(CHORD, index)
+        self.board.chord[index] = False
+        self.changed(self.board.chord_square(index))
+
+    def show_chord(self, index: int):
+        """Briefly highlights the squares a chord would click"""
+        squares = [
+            index2
+            for index2 in self.board.neighbors(index)
+            if not self.board.is_clicked(index2)
         ]
-        if self.num_mines == -1 and self.grid_size == (10, 10):
-            self.num_mines = 10
-        elif self.num_mines == -1 and self.grid_size == (20, 20):
-            self.num_mines = 50
-        elif self.num_mines == -1 and self.grid_size == (30, 30):
-            self.num_mines = 150
-        elif self.num_mines == -1:
-            self.num_mines = int((self.grid_size[0] * self.grid_size[1])/9)
-
-        mines_so_far = 0
-        while mines_so_far < self.num_mines:
-            for square, coor in self.iter_squares():
-                dice = random.randint(1, 20)
-                if dice == 2 and square not in self.around_square(*coordinates) and coor not in not_allowed_coors and mines_so_far < self.num_mines:
-                    mines_so_far += 1
-                    not_allowed_coors.append(coor)
-                    square.category = 'mine'
+        self.canvas.highlight(squares, 'brown')
 
-        self.grid = grid
+        def restore():
+            if self.canvas.winfo_exists():
+                self.canvas.unmark(squares)
 
-        for square, coor in self.iter_squares():
-            if square.category != 'mine':
-                num_mines = 0
-                for around_square in self.around_square(*coor):
-                    if around_square.category == 'mine':
-                        num_mines += 1
-                if num_mines == 0:
-                    square.category == 'blank'
-                else:
-                    square.num = num_mines
-
-        return grid
-    
-    def setup_grid(self, grid: list[list[PickleSquare]], row_num, col_num) -> list[list[Square]]:
-        Grid.rowconfigure(self.root, row_num, weight=1)
-        Grid.columnconfigure(self.root, col_num, weight=1)
-        new_grid = []
-        # Create & Configure frame
-        frame = Frame(self.root)
-        frame.grid(row=2, column=1, sticky=N+S+E+W)
-        for row_index in range(self.grid_size[0]):
-            Grid.rowconfigure(frame, row_index, weight=1)
-            row = grid[row_index]
-            new_row = []
-            for col_index in range(self.grid_size[1]):
-                btn = row[col_index]
-                new_btn = btn.to_square(frame)
-                Grid.columnconfigure(frame, col_index, weight=1)
-                new_btn.grid(row=row_index, column=col_index, sticky=N+S+E+W)
-                if new_btn.flaged:
-                    new_btn.flag()
-                elif new_btn.clicked_on:
-                    new_btn.clicked()
-                new_row.append(new_btn)
-            new_grid.append(new_row)
-        return new_grid
-
-    def around_square(self, row_num: int, col_num: int, print_=False):
-        around:list[Square] = []
-        coors = []
-
-        coors.append((row_num + 1, col_num))  # Adds the square above
-        coors.append((row_num - 1, col_num))  # Adds the square below
-        coors.append((row_num, col_num + 1))  # Adds the square to the right
-        coors.append((row_num, col_num - 1))  # Adds the square to the left
-        coors.append((row_num + 1, col_num + 1))  # Adds the top right corner
-        coors.append((row_num + 1, col_num - 1))  # Adds the top left corner
-        coors.append((row_num - 1, col_num - 1))  # Adds the bottum left corner
-        coors.append((row_num - 1, col_num + 1))  # Adds the bottum right corner
-        
-        filtered_coors = []
-        for coor in coors:
-            row, col = coor
-            try:
-                _ = self.grid[row][col]
-            except IndexError:
-                pass
+        self.root.after(1000, restore)
+
+    def get_solver(self) -> Solver:
+        if self.solver == None:
+            self.solver = Solver(self.board)
+        return self.solver
+
+    def get_probabilities(self) -> Probabilities:
+        if self.probabilities == None:
+            self.probabilities = Probabilities(self.get_solver())
+        return self.probabilities
+
+    def hint(self) -> int | None:
+        """Briefly highlights a square that is safe to click, returns `None` if there is none"""
+        if not self.playing:
+            return None
+        index = self.get_solver().hint()
+        if index == None:
+            return None
+        self.canvas.highlight([index], 'green')
+
+        def restore():
+            if self.canvas.winfo_exists():
+                self.canvas.unmark([index])
+
+        self.root.after(1000, restore)
+        return index
+
+    def best_guess(self) -> tuple[int, float] | None:
+        """Briefly highlights the square least likely to be a mine, returns it and its chance"""
+        if not self.playing:
+            return None
+        guess = self.get_probabilities().best_guess()
+        if guess == None:
+            return None
+        index = guess[0]
+        self.canvas.highlight([index], 'orange')
+
+        def restore():
+            if self.canvas.winfo_exists():
+                self.canvas.unmark([index])
+                if self.heat_map:
+                    self.draw_heat_map()
+
+        self.root.after(1000, restore)
+        return guess
+
+    def toggle_heat_map(self):
+        self.heat_map = not self.heat_map
+        if self.heat_map:
+            self.draw_heat_map()
+        else:
+            self.clear_heat_map()
+
+    def draw_heat_map(self):
+        """Colors the squares on the edge of the opened area from green to red by their chance of being a mine"""
+        chances = self.get_probabilities().compute()
+        groups = {}
+        for index, chance in chances.items():
+            if not self.board.flagged[index]:
+                groups.setdefault(round(chance * 100), []).append(index)
+        self.canvas.unmark(self.heat_marked.difference(chances))
+        self.heat_marked = set()
+        for percent, indexes in groups.items():
+            red = round(255 * percent / 100)
+            self.canvas.mark(indexes, f'#{red:02x}{255 - red:02x}00', str(percent))
+            self.heat_marked.update(indexes)
+
+    def clear_heat_map(self):
+        self.canvas.unmark(self.heat_marked)
+        self.heat_marked = set()
+
+    def auto_solve(self) -> int:
+        """Clicks every square that is proven safe until a guess is needed, returns how many squares were opened"""
+        if not self.playing or self.search != None:
+            return 0
+        if not self.board.generated and self.no_guessing:
+            # The first click starts a search for the board, it is clicked when that is done
+            self.reveal(self.get_solver().hint())
+            return 0
+        return len(self.get_solver().solve(self.reveal))
+
+    def show_results(self) -> int:
+        """Shows where all the mines were and which flags were right, returns how many mines were found"""
+        mines_found = 0
+        self.clear_heat_map()
+        for index in self.board.mine_indexes():
+            if not self.board.flagged[index]:
+                self.canvas.show_mine(index)
+        for index in self.board.flagged_indexes():
+            if self.board.mines[index]:
+                mines_found += 1
+                self.canvas.set_text(index, '✅')
             else:
-                if coor[0] >= 0 and coor[1] >= 0:
-                    filtered_coors.append(coor)
-        
-        if print_:
-            print(f'\nFor y:{row_num} x:{col_num}\n{filtered_coors}')
-
-        for coor in filtered_coors:
-            row, col = coor
-            try:
-                around.append(self.grid[row][col])
-            except IndexError:
-                pass
-
-        for square in around:
-            yield square
-    
-    def iter_rows(self):
-        for row in self.grid:
-            yield row
-    
-    def iter_squares(self):
-        for row in self.grid:
-            for square in row:
-                yield square, (self.grid.index(row), row.index(square))
+                self.canvas.set_text(index, '❌')
+        return mines_found
 
 
 class PickleButtonGrid:
-    """Same as `ButtonGrid` but is used to pickle and save data"""
+    """What version 1 game files pickled in place of a `ButtonGrid`, only kept so they can still be opened"""
 
     def __init__(self, grid_size: tuple[int, int], grid: list[list[PickleSquare]]) -> None:
         self.grid_size = grid_size
         self.grid = grid
 
-    def to_grid(self, window) -> ButtonGrid:
-        return ButtonGrid(self.grid_size, window, self.grid)
-
-    @classmethod
-    def from_grid(cls, button_grid: ButtonGrid):
-        grid = [
-            [PickleSquare.from_square(square) for square in row]
-            for row in button_grid.grid
-        ]
-
-        return cls(button_grid.grid_size, grid)
+    def to_board(self, num_mines: int = -1) -> Board:
+        """`num_mines` is used when the game was saved before the first click, so no mines were placed yet"""
+        squares = [square for row in self.grid for square in row]
+        placed = sum(square.category == 'mine' for square in squares)
+        board = Board(self.grid_size, placed or num_mines)
+        for index, square in enumerate(squares):
+            board.mines[index] = square.category == 'mine'
+            board.counts[index] = square.num or 0
+            board.flagged[index] = square.flaged
+            board.revealed[index] = square.clicked_on and not square.flaged
+            board.chord[index] = square.chord
+            if square.game_over:
+                board.exploded = index
+        board.generated = placed > 0
+        board.recount()
+        return board
 
 
 if __name__ == '__main__':
@@ -0,0 +1,142 @@
+"""Keeps every finished game in a SQLite database so highscores can be looked up by game size.
+
+The database is opened in WAL mode, so two game windows (or two copies of Pit Mopper) can
+record games at the same time without one of them losing its write. Best times are cached
+for the session, so starting a game does not have to go to the disk.
+"""
+import os
+import pickle
+import sqlite3
+from datetime import datetime
+from .board import default_mines
+from .constants import HIGHSCORE_DB, HIGHSCORE_TXT
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    cols INTEGER NOT NULL,
+    mines INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    bbbv INTEGER,
+    won INTEGER NOT NULL,
+    finished TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_by_size ON games (rows, cols, won, seconds);
+'''
+# Bumped with `PRAGMA user_version` once the old highscore.txt has been moved into the database
+MIGRATED = 1
+# Places the old highscore.txt was kept in
+LEGACY_FILES = (HIGHSCORE_TXT, os.path.join(os.getcwd(), 'highscore.txt'))
+
+
+class LegacyUnpickler(pickle.Unpickler):
+    """highscore.txt was a pickled dict of `'{rows}x{cols}'` to seconds, it never needs a class"""
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f'{module}.{name} is not allowed in a highscore file')
+
+
+def read_legacy(path: str) -> dict[tuple[int, int], float]:
+    """Returns the best times in an old highscore.txt, anything that cannot be read is left out"""
+    try:
+        with open(path, 'rb') as f:
+            value = LegacyUnpickler(f).load()
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return {}
+    if not isinstance(value, dict):
+        return {}
+    scores = {}
+    for key, seconds in value.items():
+        try:
+            rows, cols = (int(part) for part in key.split('x'))
+        except (AttributeError, ValueError):
+            continue
+        if isinstance(seconds, (int, float)):
+            scores[rows, cols] = float(seconds)
+    return scores
+
+
+class HighscoreStore:
+    def __init__(self, path: str = HIGHSCORE_DB) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=5)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        # `(rows, cols)` to the best time, sizes that have never been won are `inf`
+        self.best_cache: dict[tuple[int, int], float] = {}
+        self.migrate()
+
+    def migrate(self):
+        """Moves the best times from highscore.txt into the database the first time it is opened"""
+        with self.connection:
+            if self.connection.execute('PRAGMA user_version').fetchone()[0] >= MIGRATED:
+                return
+            for path in LEGACY_FILES:
+                if not os.path.exists(path):
+                    continue
+                finished = datetime.fromtimestamp(os.path.getmtime(path)).isoformat(' ', 'seconds')
+                self.connection.executemany(
+                    'INSERT INTO games (rows, cols, mines, seconds, bbbv, won, finished) VALUES (?, ?, ?, ?, NULL, 1, ?)',
+                    [
+                        (rows, cols, default_mines((rows, cols)), seconds, finished)
+                        for (rows, cols), seconds in read_legacy(path).items()
+                    ]
+                )
+            self.connection.execute(f'PRAGMA user_version = {MIGRATED}')
+        for path in LEGACY_FILES:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def record_game(self, grid_size: tuple[int, int], num_mines: int, seconds: float, won: bool, bbbv: int | None = None):
+        """Adds a finished game, won or lost"""
+        with self.connection:
+            self.connection.execute(
+                'INSERT INTO games (rows, cols, mines, seconds, bbbv, won, finished) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (*grid_size, num_mines, seconds, bbbv, won, datetime.now().isoformat(' ', 'seconds'))
+            )
+        if won and grid_size in self.best_cache:
+            self.best_cache[grid_size] = min(self.best_cache[grid_size], seconds)
+
+    def best(self, grid_size: tuple[int, int]) -> float:
+        """Returns the fastest win for a game size, or `inf` if it was never won"""
+        if grid_size not in self.best_cache:
+            row = self.connection.execute(
+                'SELECT seconds FROM games WHERE rows = ? AND cols = ? AND won = 1 ORDER BY seconds LIMIT 1',
+                grid_size
+            ).fetchone()
+            self.best_cache[grid_size] = float('inf') if row == None else row[0]
+        return self.best_cache[grid_size]
+
+    def top(self, grid_size: tuple[int, int], count: int = 10) -> list[tuple[float, int, int | None, str]]:
+        """Returns `(seconds, mines, 3BV, finished)` of the fastest wins for a game size"""
+        return self.connection.execute(
+            'SELECT seconds, mines, bbbv, finished FROM games WHERE rows = ? AND cols = ? AND won = 1 ORDER BY seconds LIMIT ?',
+            (*grid_size, count)
+        ).fetchall()
+
+    def summary(self) -> list[tuple[int, int, float, int, int]]:
+        """Returns `(rows, cols, best time, wins, games played)` for every game size that was played"""
+        return [
+            (rows, cols, float('inf') if best == None else best, wins, games)
+            for rows, cols, best, wins, games in self.connection.execute(
+                'SELECT rows, cols, MIN(CASE WHEN won THEN seconds END), SUM(won), COUNT(*) '
+                'FROM games GROUP BY rows, cols ORDER BY rows * cols, rows'
+            )
+        ]
+
+    def close(self):
+        self.connection.close()
+
+
+def delete_database(path: str = HIGHSCORE_DB):
+    """Deletes the database and the files SQLite keeps next to it in WAL mode"""
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,253 @@
+"""Autosaves games by writing every move to a journal.
+
+A game is a list of segments in `AUTOSAVE`. Segment `n` is a snapshot `{game}.{n}.min` of the
+board and a journal `{game}.{n}.journal` of the moves made after the snapshot was taken.
+Moves are buffered and written in small batches by a background thread, and every
+`COMPACT_MOVES` moves a new snapshot is written and the older segments are deleted.
+
+While a game is played its `{game}.lock` is locked, so a second copy of Pit Mopper that
+starts does not recover or delete it.
+"""
+import logging
+import os
+import struct
+from datetime import datetime
+from threading import Event, Lock, Thread
+from .board import Board
+from .board_pool import pool_click
+from .constants import AUTOSAVE
+from . import save_file
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+    import fcntl
+
+# move, time played, square
+RECORD = struct.Struct('<BdQ')
+REVEAL = 1
+FLAG = 2
+CHORD_TOGGLE = 3
+CHORD = 4
+# The seed was changed before the first click, the square is the new seed
+SEED = 5
+# The board came from the board pool, the square is the first click
+POOLED = 6
+BATCH_SECONDS = 0.5
+COMPACT_MOVES = 1000
+
+
+def segment_path(directory: str, game_id: str, segment: int, extension: str) -> str:
+    return os.path.join(directory, f'{game_id}.{segment}.{extension}')
+
+
+def remove(path: str):
+    """Deletes a file, one that another program still has open is left behind for the next time"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging.warning(f'Could not delete {path}: {e}')
+
+
+def lock_path(directory: str, game_id: str) -> str:
+    return os.path.join(directory, f'{game_id}.lock')
+
+
+def lock_file(f) -> bool:
+    """Locks an open file until it is closed, returns `False` if another process has it locked"""
+    try:
+        if msvcrt != None:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def in_use(game_id: str, directory: str = AUTOSAVE) -> bool:
+    """Whether the game is being played right now, ie: by another copy of Pit Mopper"""
+    path = lock_path(directory, game_id)
+    if not os.path.exists(path):
+        return False
+    with open(path, 'wb') as f:
+        return not lock_file(f)
+
+
+def replay(board: Board, move: int, index: int):
+    """Does a move from the journal to a board, the same way `ButtonGrid` does it"""
+    if move == REVEAL:
+        board.reveal(index)
+    elif move == FLAG:
+        board.toggle_flag(index)
+    elif move == CHORD_TOGGLE:
+        board.toggle_chord(index)
+    elif move == CHORD:
+        board.chord[index] = False
+        board.chord_square(index)
+    elif move == SEED:
+        board.seed = index
+    elif move == POOLED:
+        board.generate(pool_click(board.grid_size))
+        board.move_mines_away(index)
+
+
+class Journal:
+    def __init__(
+        self,
+        board: Board,
+        start: datetime,
+        chording: bool,
+        time_played: float = 0.0,
+        directory: str = AUTOSAVE,
+        game_id: str | None = None
+    ) -> None:
+        self.board = board
+        self.start = start
+        self.chording = chording
+        self.directory = directory
+        self.game_id = game_id or datetime.now().strftime('%Y%m%d%H%M%S%f')
+        os.makedirs(directory, exist_ok=True)
+
+        self.segment = -1
+        self.moves = 0
+        self.pending = bytearray()
+        self.pending_lock = Lock()
+        self.file_lock = Lock()
+        self.file = None
+        self.deleted = False
+        self.lock = open(lock_path(directory, self.game_id), 'wb')
+        lock_file(self.lock)
+        self.compact(time_played)
+
+        self.closed = Event()
+        self.writer = Thread(target=self.write_batches, daemon=True)
+        self.writer.start()
+
+    def record(self, move: int, index: int, time_played: float):
+        """Adds a move to the journal, it is written to disk by the background thread.
+
+        Moves are recorded before the board does them, so the snapshot is taken at the next move
+        when the board has every move of the old segment done
+        """
+        if self.moves >= COMPACT_MOVES:
+            self.compact(time_played)
+        with self.pending_lock:
+            self.pending += RECORD.pack(move, time_played, index)
+        self.moves += 1
+
+    def write_batches(self):
+        while not self.closed.wait(BATCH_SECONDS):
+            self.flush()
+
+    def flush(self):
+        with self.file_lock:
+            self.write_pending(sync=True)
+
+    def write_pending(self, sync: bool):
+        """Writes the buffered moves to the current segment, `file_lock` has to be held"""
+        with self.pending_lock:
+            data = bytes(self.pending)
+            self.pending.clear()
+        if not data or self.file == None or self.file.closed:
+            return
+        self.file.write(data)
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def compact(self, time_played: float):
+        """Starts a new segment and writes a snapshot of the board for it in the background"""
+        with self.file_lock:
+            # Moves made before the snapshot have to end up in the old segment
+            self.write_pending(sync=False)
+            if self.file != None:
+                self.file.close()
+            self.segment += 1
+            self.moves = 0
+            self.file = open(segment_path(self.directory, self.game_id, self.segment, 'journal'), 'ab')
+        save = save_file.BackgroundSave(
+            segment_path(self.directory, self.game_id, self.segment, 'min'),
+            self.board, time_played, self.start, self.chording
+        )
+        Thread(target=self.write_snapshot, args=(save, self.segment), daemon=True).start()
+
+    def write_snapshot(self, save: save_file.BackgroundSave, segment: int):
+        save.run()
+        if self.deleted:
+            # The game ended while the snapshot was being written
+            delete_game(self.game_id, self.directory)
+            return
+        if save.error != None:
+            return
+        # The new snapshot has everything the older segments had
+        for old in range(segment):
+            for extension in ('min', 'journal'):
+                remove(segment_path(self.directory, self.game_id, old, extension))
+
+    def close(self, delete: bool = False):
+        """Writes what is left, `delete` removes the journal when the game is over"""
+        self.closed.set()
+        self.flush()
+        with self.file_lock:
+            self.file.close()
+        self.lock.close()
+        if delete:
+            self.deleted = True
+            delete_game(self.game_id, self.directory)
+
+
+def game_files(directory: str = AUTOSAVE) -> dict[str, dict[int, dict[str, str]]]:
+    """Returns `{game: {segment: {extension: path}}}` for every journal in `directory`"""
+    games = {}
+    if not os.path.isdir(directory):
+        return games
+    for name in os.listdir(directory):
+        parts = name.split('.')
+        if len(parts) != 3 or not parts[1].isdigit() or parts[2] not in ('min', 'journal'):
+            continue
+        game_id, segment, extension = parts
+        games.setdefault(game_id, {}).setdefault(int(segment), {})[extension] = os.path.join(directory, name)
+    return games
+
+
+def find_games(directory: str = AUTOSAVE) -> list[str]:
+    """Returns the games that can be recovered, newest first"""
+    games = game_files(directory)
+    recoverable = [
+        game_id for game_id, segments in games.items()
+        if any('min' in files for files in segments.values()) and not in_use(game_id, directory)
+    ]
+    return sorted(recoverable, reverse=True)
+
+
+def recover(game_id: str, directory: str = AUTOSAVE) -> dict:
+    """Loads the newest snapshot of a game and replays the moves made after it.
+
+    Returns the same keys as `save_file.load_game`
+    """
+    segments = game_files(directory)[game_id]
+    snapshot = max(segment for segment, files in segments.items() if 'min' in files)
+    with open(segments[snapshot]['min'], 'rb') as f:
+        data = save_file.load_game(f, mapped=False)
+
+    board = data['board']
+    for segment in sorted(segment for segment in segments if segment >= snapshot):
+        path = segments[segment].get('journal')
+        if path == None:
+            continue
+        with open(path, 'rb') as f:
+            journal = f.read()
+        # A record cut off by a crash is left out
+        for move, time_played, index in RECORD.iter_unpack(journal[:len(journal) - len(journal) % RECORD.size]):
+            replay(board, move, index)
+            data['time played'] = time_played
+    return data
+
+
+def delete_game(game_id: str, directory: str = AUTOSAVE):
+    paths = [path for segment in game_files(directory).get(game_id, {}).values() for path in segment.values()]
+    for path in paths + [lock_path(directory, game_id)]:
+        remove(path)
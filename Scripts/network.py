@@ -1,27 +1,93 @@
 import socket
+from . import protocol
+
 
 class Network:
-    def __init__(self) -> None:
+    """A connection to the multiplayer server.
+
+    Messages are queued with `send` and written together by `flush`, so a burst of moves is
+    one write. `hello` is the first message, `protocol.hello()` to play a new game by default.
+    `data` is `(game id, player)` once connected, or `None` if it could not connect
+    """
+
+    def __init__(self, server: str = '192.168.2.13', port: int = 5555, hello: bytes | None = None) -> None:
         self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server = '192.168.2.13'
-        self.port = 5555
+        self.server = server
+        self.port = port
         self.addr = (self.server, self.port)
-        self.data = self.conect()
-    
-    def conect(self):
+        self.reader = protocol.FrameReader()
+        self.received: list[tuple[int, bytes]] = []
+        self.pending: list[bytes] = []
+        # Filled in by the server's welcome, the token is needed to resume the game
+        self.token = b''
+        self.grid_size = (0, 0)
+        self.num_mines = 0
+        self.data = self.conect(hello or protocol.hello())
+
+    def conect(self, hello: bytes) -> tuple[int, int] | None:
         try:
             self.client.connect(self.addr)
-            return self.client.recv(2048).decode()
-        except Exception as e:
+            self.client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.client.sendall(hello)
+            kind, body = self.receive()
+            if kind == protocol.REDIRECT:
+                # The game is on another worker of the server
+                self.port = protocol.REDIRECT_BODY.unpack(body)[0]
+                self.addr = (self.server, self.port)
+                self.client.close()
+                self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self.reader = protocol.FrameReader()
+                return self.conect(hello)
+            if kind == protocol.ERROR:
+                raise protocol.ProtocolError(body.decode('utf-8', 'replace'))
+            if kind != protocol.WELCOME:
+                raise protocol.ProtocolError(f'Expected a welcome, got message {kind}')
+            _, game_id, player, self.token, rows, cols, self.num_mines = protocol.WELCOME_BODY.unpack(body)
+            self.grid_size = (rows, cols)
+            return game_id, player
+        except (socket.error, protocol.ProtocolError) as e:
             print(e)
-    
-    def send_data(self, data:str):
+
+    def send(self, message: bytes):
+        """Queues a message made with one of the `protocol` functions"""
+        self.pending.append(message)
+
+    def flush(self):
+        if self.pending:
+            data = b''.join(self.pending)
+            self.pending.clear()
+            self.client.sendall(data)
+
+    def receive(self, kind: int | None = None) -> tuple[int, bytes]:
+        """Waits for the next message, or the next one of `kind`, and returns `(kind, body)`.
+
+        Messages of other kinds that come first are kept for later
+        """
+        while True:
+            for number, message in enumerate(self.received):
+                if kind == None or message[0] == kind:
+                    return self.received.pop(number)
+            data = self.client.recv(65536)
+            if not data:
+                raise ConnectionError('The server closed the connection')
+            self.received.extend(self.reader.feed(data))
+
+    def send_moves(self, moves: list[tuple[int, int]]):
+        self.send(protocol.encode_moves(moves))
+        self.flush()
+
+    def send_data(self, data: str) -> str | None:
+        """Sends text and waits for the text the server answers with"""
         try:
-            self.client.send(data.encode())
-            return self.client.recv(2048).decode()
-        except socket.error as e:
+            self.send(protocol.text(data))
+            self.flush()
+            return self.receive(protocol.TEXT)[1].decode('utf-8')
+        except (socket.error, protocol.ProtocolError) as e:
             print(e)
 
+    def close(self):
+        self.client.close()
+
 
 def check_internet(host="8.8.8.8", port=53, timeout=3):
     """
@@ -0,0 +1,127 @@
+"""Makes boards that can be cleared from the first click without guessing.
+
+A board only depends on its seed and first click, so a no guessing board is found by trying
+seeds until the solver can clear the board they make. The seed is all that has to be kept,
+saves and journals make the same board from it.
+
+The first few seeds are tried right away since most sizes find one in a few tries. After
+that, batches of seeds are spread over a process pool, and the batches that are still waiting
+are cancelled as soon as one finds a seed.
+
+A game searches on a `SeedSearch` thread so the window keeps responding, and gives up after
+`SEARCH_SECONDS` since big boards with many mines can take a long time or never find one.
+"""
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from threading import Event, Thread
+from .board import Board
+from .solver import Solver
+
+# Seeds tried before the process pool is used
+LOCAL_SEEDS = 32
+# Seeds each process tries per batch, small so a cancelled search does not leave much running
+BATCH_SEEDS = 16
+# Seeds tried in total before giving up
+MAX_SEEDS = 20000
+# Seconds a game searches for before it uses a board that might need a guess
+SEARCH_SECONDS = 10
+# Seconds between checks of whether a search was stopped or ran out of time
+CHECK_SECONDS = 0.1
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """The process pool is kept for the next board since starting processes is slow"""
+    global _pool
+    if _pool == None:
+        _pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _pool
+
+
+def shutdown():
+    global _pool
+    if _pool != None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def can_solve(grid_size: tuple[int, int], num_mines: int, seed: int, first_click: int) -> bool:
+    """Whether the solver can clear the board made from `seed` without guessing"""
+    board = Board(grid_size, num_mines, seed)
+    solver = Solver(board)
+    solver.update(board.reveal(first_click))
+    solver.solve()
+    return board.is_won()
+
+
+def search(grid_size: tuple[int, int], num_mines: int, first_click: int, seeds: list[int]) -> int | None:
+    """Returns the first seed that makes a no guessing board, runs in the process pool"""
+    for seed in seeds:
+        if can_solve(grid_size, num_mines, seed, first_click):
+            return seed
+    return None
+
+
+def find_seed(board: Board, first_click: int, stop: Event | None = None, timeout: float | None = None) -> int | None:
+    """Returns a seed that gives a no guessing board for the size and mines of `board`.
+
+    The seeds tried come from the board's own seed. Returns `None` if no seed was found,
+    `stop` was set or `timeout` seconds went by
+    """
+    deadline = time.monotonic() + timeout if timeout != None else None
+
+    def given_up() -> bool:
+        return (stop != None and stop.is_set()) or (deadline != None and time.monotonic() > deadline)
+
+    rng = random.Random(board.seed)
+    seeds = [rng.randrange(2**32) for _ in range(MAX_SEEDS)]
+    for seed in seeds[:LOCAL_SEEDS]:
+        if given_up():
+            return None
+        if can_solve(board.grid_size, board.num_mines, seed, first_click):
+            return seed
+
+    pool = get_pool()
+    batches = [seeds[start:start + BATCH_SEEDS] for start in range(LOCAL_SEEDS, MAX_SEEDS, BATCH_SEEDS)]
+    # Keep every process busy with a couple of batches queued behind it
+    ahead = 2 * (os.cpu_count() or 1)
+    futures = {}
+    next_batch = 0
+    try:
+        while next_batch < len(batches) or futures:
+            while next_batch < len(batches) and len(futures) < ahead:
+                future = pool.submit(search, board.grid_size, board.num_mines, first_click, batches[next_batch])
+                futures[future] = next_batch
+                next_batch += 1
+            done, _ = wait(futures, CHECK_SECONDS, FIRST_COMPLETED)
+            if given_up():
+                return None
+            for future in done:
+                futures.pop(future)
+                found = future.result()
+                if found != None:
+                    return found
+    finally:
+        for future in futures:
+            future.cancel()
+    return None
+
+
+class SeedSearch(Thread):
+    """Runs `find_seed` for a game, `seed` is set when the thread is done"""
+    def __init__(self, board: Board, first_click: int, timeout: float = SEARCH_SECONDS) -> None:
+        super().__init__(daemon=True)
+        self.board = board
+        self.first_click = first_click
+        self.timeout = timeout
+        self.stopped = Event()
+        self.seed: int | None = None
+
+    def run(self):
+        self.seed = find_seed(self.board, self.first_click, self.stopped, self.timeout)
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,372 @@
+"""Works out the chance that every hidden square is a mine, from the constraints a `Solver` keeps.
+
+The squares on the edge of the opened area are split into components, constraints that do
+not share any squares can be counted on their own. Each component is counted square by square
+keeping only the mines still needed by the constraints that have been started, so the same
+state is never counted twice. That gives for every number of mines `k` in the component the
+number of ways to place them and how many of those ways have a mine on each square.
+
+The components are then combined, weighting every total number of mines on the edge by the
+number of ways to place the rest of the mines on the squares away from the edge. Counts are
+kept relative to the biggest one so huge boards do not overflow.
+
+Components are cached by their constraints, so after a move only the ones it touched are counted again.
+Combining them pairs the components up into a tree instead of multiplying all the others
+together for every component, so boards with hundreds of components stay fast.
+"""
+import math
+from functools import lru_cache
+from itertools import repeat
+from operator import add, mul
+from .chunks import ChunkedBoard
+from .solver import Solver
+
+# A component that would need more states than this is estimated instead of counted
+MAX_STATES = 200000
+
+
+class ComponentTooBig(Exception):
+    pass
+
+
+def find_components(solver: Solver) -> list[tuple[tuple[tuple[int, ...], int], ...]]:
+    """Splits the constraints of a solver into groups that share squares.
+
+    Each component is a sorted tuple of `(cells, mines)` so it can be used as a cache key
+    """
+    components = []
+    seen = set()
+    for start in solver.constraints:
+        if start in seen:
+            continue
+        seen.add(start)
+        stack = [start]
+        component = []
+        while stack:
+            key = stack.pop()
+            constraint = solver.constraints[key]
+            component.append((tuple(sorted(constraint.cells)), constraint.mines))
+            for cell in constraint.cells:
+                for other in solver.watchers[cell]:
+                    if other not in seen:
+                        seen.add(other)
+                        stack.append(other)
+        components.append(tuple(sorted(component)))
+    return components
+
+
+def order_cells(component: tuple[tuple[tuple[int, ...], int], ...]) -> list[int]:
+    """Orders the squares of a component so constraints are finished soon after they are started"""
+    by_cell = {}
+    for number, (cells, _) in enumerate(component):
+        for cell in cells:
+            by_cell.setdefault(cell, []).append(number)
+    order = []
+    placed = set()
+    done = set()
+    for first in sorted(by_cell):
+        if first in placed:
+            continue
+        placed.add(first)
+        queue = [first]
+        while queue:
+            cell = queue.pop(0)
+            order.append(cell)
+            for number in by_cell[cell]:
+                if number in done:
+                    continue
+                done.add(number)
+                for cell2 in component[number][0]:
+                    if cell2 not in placed:
+                        placed.add(cell2)
+                        queue.append(cell2)
+    return order
+
+
+def add_poly(total: list, poly: list, shift: int):
+    if len(total) < len(poly) + shift:
+        total.extend([0] * (len(poly) + shift - len(total)))
+    for k, ways in enumerate(poly):
+        total[k + shift] += ways
+
+
+def multiply(a: list, b: list) -> list:
+    """Multiplies two polynomials, the inner loop runs over the longer one with `map` so it stays in C"""
+    if len(a) < len(b):
+        a, b = b, a
+    result = [0] * (len(a) + len(b) - 1)
+    for j, y in enumerate(b):
+        if y:
+            result[j:j + len(a)] = map(add, result[j:j + len(a)], map(mul, a, repeat(y)))
+    return result
+
+
+def correlate(poly: list, target: list, length: int) -> list:
+    """Returns `result[k] = sum(poly[j] * target[k + j])` for the first `length` values of `k`"""
+    result = [0.0] * length
+    for j, y in enumerate(poly):
+        if y:
+            part = target[j:j + length]
+            result[:len(part)] = map(add, result[:len(part)], map(mul, part, repeat(y)))
+    return result
+
+
+def scaled(poly: list) -> list:
+    """Scales a polynomial so its biggest value is 1, only the ratios between values are used"""
+    top = max(poly, default=0)
+    return [value / top for value in poly] if top else poly
+
+
+def weigh_components(polys: list[list[float]], weights: list[float]) -> tuple[list[float], list[list[float]]]:
+    """Returns every polynomial multiplied together, and for each polynomial `n` the weight of it having `k`
+    mines: `sum(others[j] * weights[k + j])` where `others` is every other polynomial multiplied together.
+
+    The polynomials are paired up into a tree, so the products of the others are passed down it instead
+    of being made again for every polynomial. Every result is scaled by a constant of its own
+    """
+    products = {}
+
+    def product(low: int, high: int) -> list:
+        if high - low == 1:
+            return polys[low]
+        if (low, high) not in products:
+            middle = (low + high) // 2
+            products[low, high] = scaled(multiply(product(low, middle), product(middle, high)))
+        return products[low, high]
+
+    weight_of = [None] * len(polys)
+
+    def pass_down(low: int, high: int, target: list):
+        if high - low == 1:
+            weight_of[low] = target
+            return
+        middle = (low + high) // 2
+        left = product(low, middle)
+        right = product(middle, high)
+        pass_down(low, middle, scaled(correlate(right, target, len(left))))
+        pass_down(middle, high, scaled(correlate(left, target, len(right))))
+
+    if not polys:
+        return [1.0], []
+    everything = product(0, len(polys))
+    pass_down(0, len(polys), weights[:len(everything)])
+    return everything, weight_of
+
+
+@lru_cache(maxsize=512)
+def count_component(component: tuple[tuple[tuple[int, ...], int], ...]) -> tuple[list[float], dict[int, list[float]]]:
+    """Returns `(ways, mine ways)` where `ways[k]` is the number of ways `k` mines fit in the component
+    and `mine ways[cell][k]` is how many of those have a mine on `cell`, both scaled so the biggest is 1
+    """
+    order = order_cells(component)
+    position = {cell: number for number, cell in enumerate(order)}
+    first = [min(position[cell] for cell in cells) for cells, _ in component]
+    last = [max(position[cell] for cell in cells) for cells, _ in component]
+    # The constraints that have been started and not finished before each square
+    open_at = [
+        [number for number in range(len(component)) if first[number] < i <= last[number]]
+        for i in range(len(order) + 1)
+    ]
+    # `(constraint, squares of it after this one)` for the constraints each square is in
+    touching = [[] for _ in order]
+    for number, (cells, _) in enumerate(component):
+        positions = sorted(position[cell] for cell in cells)
+        for after, i in enumerate(reversed(positions)):
+            touching[i].append((number, after))
+
+    def step(i: int, state: tuple, value: int) -> tuple | None:
+        remaining = dict(zip(open_at[i], state))
+        for number, after in touching[i]:
+            left = remaining.get(number, component[number][1]) - value
+            if not 0 <= left <= after:
+                return None
+            remaining[number] = left
+        return tuple(remaining[number] for number in open_at[i + 1])
+
+    # Forward pass, the ways to fill the squares before `i` for every state
+    forward = [{(): [1]}]
+    moves = []
+    states = 0
+    for i in range(len(order)):
+        layer = {}
+        layer_moves = []
+        for state, poly in forward[i].items():
+            for value in (0, 1):
+                new_state = step(i, state, value)
+                if new_state == None:
+                    continue
+                layer_moves.append((state, value, new_state))
+                add_poly(layer.setdefault(new_state, []), poly, value)
+        states += len(layer)
+        if states > MAX_STATES:
+            raise ComponentTooBig(f'Component of {len(order)} squares needs more than {MAX_STATES} states')
+        forward.append(layer)
+        moves.append(layer_moves)
+
+    # Backward pass, the ways to fill the squares from `i` on for every state
+    backward = [None] * len(order) + [{(): [1]}]
+    for i in range(len(order) - 1, -1, -1):
+        layer = {}
+        for state, value, new_state in moves[i]:
+            after = backward[i + 1].get(new_state)
+            if after != None:
+                add_poly(layer.setdefault(state, []), after, value)
+        backward[i] = layer
+
+    ways = backward[0].get((), [0])
+    scale = max(ways) or 1
+    mine_ways = {}
+    for i, cell in enumerate(order):
+        total = []
+        for state, value, new_state in moves[i]:
+            after = backward[i + 1].get(new_state)
+            if value and after != None:
+                add_poly(total, multiply(forward[i][state], after), 1)
+        mine_ways[cell] = [count / scale for count in total]
+    return [count / scale for count in ways], mine_ways
+
+
+def estimate_component(component: tuple[tuple[tuple[int, ...], int], ...]) -> tuple[list[float], dict[int, list[float]]]:
+    """Stands in for `count_component` on components that are too big, using each square's worst constraint"""
+    chance = {}
+    for cells, mines in component:
+        for cell in cells:
+            chance[cell] = max(chance.get(cell, 0.0), mines / len(cells))
+    k = round(sum(chance.values()))
+    return [0.0] * k + [1.0], {cell: [0.0] * k + [p] for cell, p in chance.items()}
+
+
+class Probabilities:
+    """Mine chances for the hidden squares of a board, worked out from what its solver knows"""
+
+    def __init__(self, solver: Solver) -> None:
+        self.solver = solver
+        self.board = solver.board
+        self.frontier: dict[int, float] = {}
+        self.interior = 0.0
+        self.interior_count = 0
+        # False when a component was too big to count and was estimated
+        self.exact = True
+        # What the chances were last worked out from, they are kept until it changes
+        self.last = None
+
+    def compute(self) -> dict[int, float]:
+        """Works out the chances if the board changed and returns them for the squares on the edge of the opened area"""
+        solver = self.solver
+        board = self.board
+        mines_left = board.num_mines - len(solver.mines)
+        unknown = board.size - board.revealed_safe - len(solver.mines) - len(solver.safe)
+        interior = unknown - len(solver.watchers)
+        components = find_components(solver)
+        key = (components, mines_left, interior)
+        if key == self.last:
+            return self.frontier
+        self.last = key
+        self.interior_count = interior
+        self.exact = True
+
+        results = []
+        for component in components:
+            try:
+                results.append(count_component(component))
+            except ComponentTooBig:
+                self.exact = False
+                results.append(estimate_component(component))
+
+        # Ways to place the rest of the mines away from the edge, as logs so huge boards do not overflow
+        def log_rest(k: int) -> float | None:
+            rest = mines_left - k
+            if not 0 <= rest <= interior:
+                return None
+            return math.lgamma(interior + 1) - math.lgamma(rest + 1) - math.lgamma(interior - rest + 1)
+
+        # Every mine on the edge is one less away from it, which changes the ways by about the same
+        # factor each time. Taking that factor out of the weights and putting it into the components
+        # keeps the products of hundreds of components from overflowing or rounding to 0
+        likely = min(sum(max(range(len(ways)), key=ways.__getitem__) for ways, _ in results), mines_left)
+        here, after = log_rest(likely), log_rest(likely + 1)
+        slope = after - here if here != None and after != None else 0.0
+
+        polys = []
+        tilted = []
+        for ways, mine_ways in results:
+            shift = max(math.log(count) + k * slope for k, count in enumerate(ways) if count)
+            factors = [math.exp(k * slope - shift) for k in range(len(ways))]
+            polys.append(list(map(mul, ways, factors)))
+            tilted.append({cell: list(map(mul, counts, factors)) for cell, counts in mine_ways.items()})
+
+        length = sum(len(poly) - 1 for poly in polys) + 1
+        logs = [log_rest(k) for k in range(length)]
+        logs = [None if value == None else value - k * slope for k, value in enumerate(logs)]
+        top = max((value for value in logs if value != None), default=None)
+        weights = [0.0 if value == None or top == None else math.exp(value - top) for value in logs]
+        everything, weight_of = weigh_components(polys, weights)
+        total = sum(map(mul, everything, weights))
+        if not total:
+            # Nothing adds up, ie: the player lost and a mine was revealed
+            self.frontier = {}
+            self.interior = mines_left / interior if interior else 0.0
+            return self.frontier
+
+        self.frontier = {}
+        for poly, mine_ways, weight in zip(polys, tilted, weight_of):
+            # Each component's weights have a scale of their own, its total has the same one
+            component_total = sum(map(mul, poly, weight))
+            if not component_total:
+                continue
+            for cell, counts in mine_ways.items():
+                self.frontier[cell] = sum(map(mul, counts, weight)) / component_total
+
+        if interior:
+            expected = sum(
+                ways * weight * (mines_left - k)
+                for k, (ways, weight) in enumerate(zip(everything, weights))
+            )
+            self.interior = expected / total / interior
+        else:
+            self.interior = 0.0
+        return self.frontier
+
+    def probability(self, index: int) -> float:
+        """Returns the last computed chance of a square being a mine"""
+        if index in self.solver.mines:
+            return 1.0
+        if index in self.solver.safe or self.board.revealed[index]:
+            return 0.0
+        return self.frontier.get(index, self.interior)
+
+    def interior_square(self) -> int | None:
+        """Returns a hidden square away from the edge, corners first since they are the most likely to open an area"""
+        board = self.board
+        solver = self.solver
+
+        def usable(index: int) -> bool:
+            return solver.is_unknown(index) and index not in solver.watchers and not board.flagged[index]
+
+        corners = (0, board.cols - 1, board.size - board.cols, board.size - 1)
+        for index in corners:
+            if usable(index):
+                return index
+        # Looking at every square of a board that is made in chunks would make all of it
+        indexes = board.made_indexes() if isinstance(board, ChunkedBoard) else range(board.size)
+        for index in indexes:
+            if usable(index):
+                return index
+        return None
+
+    def best_guess(self) -> tuple[int, float] | None:
+        """Returns the square least likely to be a mine and its chance, after computing the chances again"""
+        safe = self.solver.safe_moves()
+        if safe:
+            return safe[0], 0.0
+        self.compute()
+        flagged = self.board.flagged
+        choices = [(chance, index) for index, chance in self.frontier.items() if not flagged[index]]
+        if self.interior_count:
+            index = self.interior_square()
+            if index != None:
+                choices.append((self.interior, index))
+        if not choices:
+            return None
+        chance, index = min(choices)
+        return index, chance
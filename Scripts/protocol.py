@@ -0,0 +1,256 @@
+"""The messages the multiplayer client and server send each other.
+
+Every message is a frame: its length as a 4 byte little endian number, then a byte for the
+kind of message and then the body. Several frames can be written at once, the reader splits
+them up again, so a batch of messages costs one write and one read.
+
+The first message from the client is `HELLO` with `MAGIC`, its `VERSION` and what it wants
+to do: play a new game, resume a game it lost the connection to or watch a game. The server
+answers with `WELCOME` or `ERROR` and closes the connection if the versions do not match.
+
+The server owns the boards, clients send `MOVES` and get a `DELTA` with the squares that
+changed every time a board changes. Deltas of each board are numbered, a client that
+resumes or starts watching gets the deltas it missed, or a `SNAPSHOT` if it missed too many.
+
+A server with several workers can answer a hello with `REDIRECT` to the port of the worker
+the game is on, the client sends its hello again there. The workers and their coordinator
+talk with `FIND`, `FOUND` and `WAITING`, clients never see those.
+"""
+import struct
+import zlib
+from typing import Iterable, Iterator
+from .board import Board
+
+MAGIC = b'PMOP'
+VERSION = 2
+LENGTH = struct.Struct('<I')
+# Frames bigger than this are never sent, a length over it means the stream is broken
+MAX_FRAME = 1 << 20
+
+# Kinds of messages
+HELLO = 1
+WELCOME = 2
+ERROR = 3
+TEXT = 4
+MOVES = 5
+DELTA = 6
+SNAPSHOT = 7
+PING = 8
+PONG = 9
+REDIRECT = 10
+FIND = 11
+FOUND = 12
+WAITING = 13
+
+# What the client wants to do after saying hello
+PLAY = 0
+RESUME = 1
+WATCH = 2
+
+# magic, version, it stays the same in every version so a wrong version can be told apart
+# from a broken hello. What the client wants to do and its details come after it
+HELLO_BODY = struct.Struct('<4sH')
+# rows, cols, mines
+PLAY_BODY = struct.Struct('<HHi')
+# game id, player, token, last sequence number seen of player 1 and player 2
+RESUME_BODY = struct.Struct('<IB8sII')
+# game id, last sequence number seen of player 1 and player 2
+WATCH_BODY = struct.Struct('<III')
+# version, game id, player (0 when watching), token, rows, cols, mines
+WELCOME_BODY = struct.Struct('<HIB8sHHI')
+# port of the worker to connect to
+REDIRECT_BODY = struct.Struct('<H')
+# request number, rows, cols, mines
+FIND_BODY = struct.Struct('<IHHi')
+# request number, worker with a player waiting for that game or -1
+FOUND_BODY = struct.Struct('<Ii')
+# worker, rows, cols, mines, whether a player is waiting on the worker
+WAITING_BODY = struct.Struct('<HHHi?')
+# move (see `journal`), square
+MOVE = struct.Struct('<BI')
+# sequence number, player, revealed safe squares, flags placed, exploded square
+DELTA_HEADER = struct.Struct('<IBIIi')
+# player, rows, cols, mines, sequence number, revealed safe squares, flags placed, exploded square
+SNAPSHOT_HEADER = struct.Struct('<BHHIIIIi')
+
+# How a square looks to a player, the number is in the low 4 bits
+REVEALED = 0x10
+FLAGGED = 0x20
+MINE = 0x40
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def frame(kind: int, body: bytes = b'') -> bytes:
+    return LENGTH.pack(len(body) + 1) + bytes((kind,)) + body
+
+
+class FrameReader:
+    """Splits the bytes read from a socket into `(kind, body)` messages"""
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> Iterator[tuple[int, bytes]]:
+        self.buffer += data
+        while len(self.buffer) >= LENGTH.size:
+            length = LENGTH.unpack_from(self.buffer)[0]
+            if not 0 < length <= MAX_FRAME:
+                raise ProtocolError(f'Bad frame length {length}')
+            end = LENGTH.size + length
+            if len(self.buffer) < end:
+                return
+            kind = self.buffer[LENGTH.size]
+            body = bytes(self.buffer[LENGTH.size + 1:end])
+            del self.buffer[:end]
+            yield kind, body
+
+
+def hello(grid_size: tuple[int, int] = (10, 10), num_mines: int = -1) -> bytes:
+    """Asks to play a new game"""
+    return frame(HELLO, HELLO_BODY.pack(MAGIC, VERSION) + bytes((PLAY,)) + PLAY_BODY.pack(*grid_size, num_mines))
+
+
+def resume(game_id: int, player: int, token: bytes, sequences: tuple[int, int]) -> bytes:
+    """Asks to take a place in a game back after losing the connection"""
+    return frame(HELLO, HELLO_BODY.pack(MAGIC, VERSION) + bytes((RESUME,)) + RESUME_BODY.pack(game_id, player, token, *sequences))
+
+
+def watch(game_id: int, sequences: tuple[int, int] = (0, 0)) -> bytes:
+    return frame(HELLO, HELLO_BODY.pack(MAGIC, VERSION) + bytes((WATCH,)) + WATCH_BODY.pack(game_id, *sequences))
+
+
+def read_hello(body: bytes) -> tuple[int, int, tuple]:
+    """Returns `(version, what the client wants to do, its details)`, the details are not read if the version is wrong"""
+    if len(body) < HELLO_BODY.size:
+        raise ProtocolError('Bad hello')
+    magic, version = HELLO_BODY.unpack_from(body)
+    if magic != MAGIC:
+        raise ProtocolError('Not a Pit Mopper client')
+    if version != VERSION:
+        return version, -1, ()
+    mode = body[HELLO_BODY.size] if len(body) > HELLO_BODY.size else -1
+    details = {PLAY: PLAY_BODY, RESUME: RESUME_BODY, WATCH: WATCH_BODY}.get(mode)
+    if details == None or len(body) != HELLO_BODY.size + 1 + details.size:
+        raise ProtocolError('Bad hello')
+    return version, mode, details.unpack_from(body, HELLO_BODY.size + 1)
+
+
+def welcome(game_id: int, player: int, token: bytes, grid_size: tuple[int, int], num_mines: int) -> bytes:
+    return frame(WELCOME, WELCOME_BODY.pack(VERSION, game_id, player, token, *grid_size, num_mines))
+
+
+def redirect(port: int) -> bytes:
+    return frame(REDIRECT, REDIRECT_BODY.pack(port))
+
+
+def text(message: str) -> bytes:
+    return frame(TEXT, message.encode('utf-8'))
+
+
+def error(message: str) -> bytes:
+    return frame(ERROR, message.encode('utf-8'))
+
+
+def encode_moves(moves: Iterable[tuple[int, int]]) -> bytes:
+    """`moves` are `(move, square)` like the journal records them"""
+    return frame(MOVES, b''.join(MOVE.pack(move, index) for move, index in moves))
+
+
+def decode_moves(body: bytes) -> list[tuple[int, int]]:
+    if len(body) % MOVE.size:
+        raise ProtocolError('Bad moves')
+    return list(MOVE.iter_unpack(body))
+
+
+def write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(body: bytes, position: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        if position >= len(body):
+            raise ProtocolError('Varint runs past the end of the message')
+        byte = body[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+
+def square_state(board: Board, index: int, show_mines: bool = False) -> int:
+    """Returns what a player can see of a square, mines are only shown once they are revealed or `show_mines`"""
+    state = 0
+    if board.revealed[index]:
+        state |= REVEALED
+        if board.mines[index]:
+            state |= MINE
+        else:
+            state |= board.counts[index]
+    elif show_mines and board.mines[index]:
+        state |= MINE
+    if board.flagged[index]:
+        state |= FLAGGED
+    return state
+
+
+def counters(board: Board) -> tuple[int, int, int]:
+    return board.revealed_safe, board.flags_placed, board.exploded
+
+
+def encode_delta(sequence: int, player: int, board: Board, changes: Iterable[tuple[int, int]]) -> bytes:
+    """`changes` are `(square, state)`, squares are sent as the gap from the last one so most take a byte"""
+    body = bytearray(DELTA_HEADER.pack(sequence, player, *counters(board)))
+    last = 0
+    for index, state in sorted(changes):
+        write_varint(body, index - last)
+        body.append(state)
+        last = index
+    return frame(DELTA, bytes(body))
+
+
+def decode_delta(body: bytes) -> tuple[tuple[int, int, int, int, int], list[tuple[int, int]]]:
+    """Returns `((sequence, player, revealed safe squares, flags placed, exploded square), changes)`"""
+    if len(body) < DELTA_HEADER.size:
+        raise ProtocolError('Bad delta')
+    header = DELTA_HEADER.unpack_from(body)
+    changes = []
+    position = DELTA_HEADER.size
+    index = 0
+    while position < len(body):
+        gap, position = read_varint(body, position)
+        if position >= len(body):
+            raise ProtocolError('Delta is missing a state')
+        index += gap
+        changes.append((index, body[position]))
+        position += 1
+    return header, changes
+
+
+def encode_snapshot(board: Board, sequence: int, player: int, show_mines: bool = False) -> bytes:
+    """The whole board as a player sees it, compressed since most squares look the same"""
+    states = bytes(square_state(board, index, show_mines) for index in range(board.size))
+    header = SNAPSHOT_HEADER.pack(player, board.rows, board.cols, board.num_mines, sequence, *counters(board))
+    return frame(SNAPSHOT, header + zlib.compress(states))
+
+
+def decode_snapshot(body: bytes) -> tuple[tuple[int, int, int, int, int, int, int, int], bytes]:
+    """Returns `((player, rows, cols, mines, sequence, revealed safe squares, flags placed, exploded square), state of every square)`"""
+    if len(body) < SNAPSHOT_HEADER.size:
+        raise ProtocolError('Bad snapshot')
+    header = SNAPSHOT_HEADER.unpack_from(body)
+    rows, cols = header[1:3]
+    try:
+        states = zlib.decompress(body[SNAPSHOT_HEADER.size:])
+    except zlib.error as e:
+        raise ProtocolError(f'Bad snapshot: {e}')
+    if len(states) != rows * cols:
+        raise ProtocolError('Snapshot does not match its size')
+    return header, states
@@ -0,0 +1,358 @@
+"""Reads and writes Pit Mopper game files (`.min`).
+
+Version 2 files are a fixed header followed by the planes of the board, one bit per square:
+
+    header   see `HEADER`
+    mines    left out for chunked boards, they are made again from the seed and first click
+    revealed
+    flagged
+    chord
+
+Rows of a chunked board where no chunk was made are all zeros and are skipped when writing, which
+leaves a hole in the file, so snapshots of huge boards only cost as much as the part that was played.
+
+Version 1 files were a pickled dict, they can still be opened but only the classes that
+were saved in them are allowed to be unpickled.
+"""
+import io
+import mmap
+import os
+import pickle
+import re
+import struct
+import sys
+import tempfile
+from threading import Thread
+from datetime import datetime
+from .board import Board
+from .chunks import ChunkedBoard
+
+MAGIC = b'PMOP'
+VERSION = 2
+# magic, version, rows, cols, mines, seed, first click, exploded, time played, start, chording, chunked,
+# revealed safe squares, flags placed, correct flags
+HEADER = struct.Struct('<4sBIIIQqqdd??QQQ')
+PLANES = ('mines', 'revealed', 'flagged', 'chord')
+# Rows are read and written this many at a time, a multiple of 8 so every block is whole bytes
+BLOCK_ROWS = 256
+
+_UNPACK = [bytes((byte >> bit) & 1 for bit in range(8)) for byte in range(256)]
+_PACK = {int.from_bytes(bits, sys.byteorder): byte for byte, bits in enumerate(_UNPACK)}
+
+
+def pack_bits(plane: bytes) -> bytes:
+    """Packs a plane of 0s and 1s into 8 squares per byte"""
+    plane = bytes(plane) + bytes(-len(plane) % 8)
+    return bytes(map(_PACK.__getitem__, memoryview(plane).cast('Q')))
+
+
+def unpack_bits(packed: bytes) -> bytes:
+    """Opposite of `pack_bits`, the result is padded to a multiple of 8"""
+    return b''.join(map(_UNPACK.__getitem__, packed))
+
+
+class SaveHeader:
+    def __init__(
+        self,
+        grid_size: tuple[int, int],
+        num_mines: int,
+        seed: int,
+        first_click: int = -1,
+        exploded: int = -1,
+        time_played: float = 0.0,
+        start: datetime | None = None,
+        chording: bool = False,
+        chunked: bool = False,
+        counters: tuple[int, int, int] = (0, 0, 0),
+        version: int = VERSION
+    ) -> None:
+        self.grid_size = grid_size
+        self.num_mines = num_mines
+        self.seed = seed
+        self.first_click = first_click
+        self.exploded = exploded
+        self.time_played = time_played
+        self.start = start or datetime.now()
+        self.chording = chording
+        self.chunked = chunked
+        # Saved so opening a game does not have to look at every square to count them
+        self.counters = counters
+        self.version = version
+
+    def pack(self) -> bytes:
+        return HEADER.pack(
+            MAGIC, self.version, *self.grid_size, self.num_mines, self.seed, self.first_click,
+            self.exploded, self.time_played, self.start.timestamp(), self.chording, self.chunked,
+            *self.counters
+        )
+
+    @classmethod
+    def unpack(cls, data: bytes):
+        magic, version, rows, cols, num_mines, seed, first_click, exploded, time_played, start, chording, chunked, *counters = HEADER.unpack(data)
+        if magic != MAGIC:
+            raise ValueError('Not a Pit Mopper game file')
+        if version != VERSION:
+            raise ValueError(f'Game file version {version} is not supported')
+        return cls((rows, cols), num_mines, seed, first_click, exploded, time_played, datetime.fromtimestamp(start), chording, chunked, tuple(counters), version)
+
+    @classmethod
+    def from_board(cls, board: Board, time_played: float, start: datetime, chording: bool):
+        chunked = isinstance(board, ChunkedBoard)
+        return cls(
+            board.grid_size,
+            board.requested_mines if chunked else board.num_mines,
+            board.seed,
+            board.first_click,
+            board.exploded,
+            time_played,
+            start,
+            chording,
+            chunked,
+            (board.revealed_safe, board.flags_placed, board.correct_flags)
+        )
+
+    @property
+    def planes(self) -> tuple[str, ...]:
+        return PLANES[1:] if self.chunked else PLANES
+
+    @property
+    def plane_size(self) -> int:
+        """Number of bytes each plane takes up in the file"""
+        return -(-self.grid_size[0] * self.grid_size[1] // 8)
+
+
+class GameWriter:
+    """Writes a game file a block of rows at a time"""
+
+    def __init__(self, f: io.BufferedIOBase, header: SaveHeader) -> None:
+        self.f = f
+        self.header = header
+
+    def write(self, board: Board):
+        self.f.write(self.header.pack())
+        rows, cols = self.header.grid_size
+        skipped = False
+        for name in self.header.planes:
+            for start in range(0, rows, BLOCK_ROWS):
+                stop = min(start + BLOCK_ROWS, rows)
+                if isinstance(board, ChunkedBoard) and not board.made_rows(start, stop):
+                    if board.source == None:
+                        # Nothing was made there so it is all zeros, skipping it leaves a hole in the file
+                        self.f.seek(-(-(stop - start) * cols // 8), io.SEEK_CUR)
+                        skipped = True
+                        continue
+                    # The file the board came from already has these rows packed
+                    self.f.write(board.source.packed(name, start * cols, stop * cols))
+                else:
+                    self.f.write(pack_bits(board.plane_rows(name, start, stop)))
+                skipped = False
+        if skipped:
+            # Seeking past the end does not make the file longer until something is written there
+            self.f.seek(-1, io.SEEK_CUR)
+            self.f.write(bytes(1))
+
+
+class MappedPlanes:
+    """The planes of a game file, memory mapped so only the squares that are looked at get decoded"""
+
+    def __init__(self, f: io.BufferedIOBase, header: SaveHeader) -> None:
+        self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        name = getattr(f, 'name', None)
+        self.path = os.path.abspath(name) if isinstance(name, str) else None
+        self.header = header
+        self.cols = header.grid_size[1]
+        self.offsets = {
+            name: HEADER.size + number * header.plane_size
+            for number, name in enumerate(header.planes)
+        }
+        self.plane_size = header.plane_size
+        # Boards that share this map, it is closed when the last one closes it
+        self.users = 1
+
+    def reopen(self) -> 'MappedPlanes':
+        """Maps the file again so a copy of the board can be closed on its own, shares the map if the path is not known"""
+        if self.path == None:
+            self.users += 1
+            return self
+        with open(self.path, 'rb') as f:
+            return MappedPlanes(f, self.header)
+
+    def is_file(self, path: str) -> bool:
+        return self.path != None and os.path.exists(path) and os.path.samefile(self.path, path)
+
+    def close(self):
+        self.users -= 1
+        if not self.users:
+            self.map.close()
+
+    def read(self, name: str, row: int, col: int, count: int) -> bytes:
+        """Decodes `count` squares of one row of a plane"""
+        start = row * self.cols + col
+        first = start // 8
+        offset = self.offsets[name]
+        bits = unpack_bits(self.map[offset + first:offset + -(-(start + count) // 8)])
+        return bits[start - first * 8:start - first * 8 + count]
+
+    def packed(self, name: str, start: int, stop: int) -> bytes:
+        """Returns squares `start` to `stop` of a plane as they are in the file, `start` has to be a multiple of 8"""
+        offset = self.offsets[name]
+        return self.map[offset + start // 8:offset + -(-stop // 8)]
+
+    def nonzero(self, name: str):
+        """Yields the index of the first square of every byte of a plane that has something set"""
+        offset = self.offsets[name]
+        for match in re.finditer(rb'[^\x00]', self.map[offset:offset + self.plane_size]):
+            yield match.start() * 8
+
+
+class GameReader:
+    """Reads a game file a block of rows at a time"""
+
+    def __init__(self, f: io.BufferedIOBase) -> None:
+        self.f = f
+        self.header = SaveHeader.unpack(f.read(HEADER.size))
+
+    def iter_plane(self):
+        """Yields `(first row, plane of the rows)` for the next plane in the file"""
+        rows, cols = self.header.grid_size
+        for start in range(0, rows, BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, rows)
+            cells = (stop - start) * cols
+            yield start, unpack_bits(self.f.read(-(-cells // 8)))[:cells]
+
+    def can_map(self) -> bool:
+        try:
+            self.f.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            return False
+        return True
+
+    def read_mapped(self) -> Board:
+        """Opens a chunked game without reading its planes, chunks are decoded from the file when they are used"""
+        header = self.header
+        board = ChunkedBoard(header.grid_size, header.num_mines, header.seed)
+        if header.first_click != -1:
+            board.generate(header.first_click)
+        board.source = MappedPlanes(self.f, header)
+        # Flags are few, the chunks that have them are loaded now so the game over screen can show them
+        for index in board.source.nonzero('flagged'):
+            board.chunk(board.locate(min(index, board.size - 1))[0])
+        board.exploded = header.exploded
+        board.revealed_safe, board.flags_placed, board.correct_flags = header.counters
+        return board
+
+    def read(self, mapped: bool = True) -> Board:
+        header = self.header
+        if header.chunked and mapped and self.can_map():
+            return self.read_mapped()
+        if header.chunked:
+            board = ChunkedBoard(header.grid_size, header.num_mines, header.seed)
+        else:
+            board = Board(header.grid_size, header.num_mines, header.seed)
+        if header.first_click != -1:
+            board.first_click = header.first_click
+            board.generated = True
+            if header.chunked:
+                board.generate(header.first_click)
+
+        cols = header.grid_size[1]
+        for name in header.planes:
+            plane = getattr(board, name)
+            for start, rows in self.iter_plane():
+                if header.chunked:
+                    # Only touch the chunks that have something in them
+                    offset = start * cols
+                    position = rows.find(1)
+                    while position != -1:
+                        plane[offset + position] = 1
+                        position = rows.find(1, position + 1)
+                else:
+                    plane[start * cols:start * cols + len(rows)] = rows
+
+        if header.first_click != -1 and not header.chunked:
+            board.compute_counts()
+        board.exploded = header.exploded
+        board.revealed_safe, board.flags_placed, board.correct_flags = header.counters
+        return board
+
+
+def save_game(f: io.BufferedIOBase, board: Board, time_played: float, start: datetime, chording: bool):
+    GameWriter(f, SaveHeader.from_board(board, time_played, start, chording)).write(board)
+
+
+class BackgroundSave(Thread):
+    """Saves a snapshot of a board on another thread.
+
+    The game is written to a temporary file next to `path` which then replaces `path`, so a
+    save that fails or is cut off never leaves a broken file behind. `error` is set if it failed
+    """
+
+    def __init__(self, path: str, board: Board, time_played: float, start: datetime, chording: bool) -> None:
+        super().__init__(daemon=True)
+        self.path = path
+        if isinstance(board, ChunkedBoard) and board.source != None and board.source.is_file(path):
+            # Windows cannot replace a file that is mapped, so the board stops reading from it first
+            board.load_source()
+        self.board = board.snapshot()
+        self.time_played = time_played
+        self.game_start = start
+        self.chording = chording
+        self.error: Exception | None = None
+
+    def run(self):
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(self.path)))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                save_game(f, self.board, self.time_played, self.game_start, self.chording)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            self.error = e
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        finally:
+            if isinstance(self.board, ChunkedBoard):
+                self.board.close_source()
+
+
+class LegacyUnpickler(pickle.Unpickler):
+    """Only lets the classes that version 1 game files were made of be unpickled"""
+    allowed = {
+        ('datetime', 'datetime'),
+        ('Scripts.grid', 'PickleButtonGrid'),
+        ('Scripts.squares', 'PickleSquare'),
+    }
+
+    def find_class(self, module, name):
+        if (module, name) not in self.allowed:
+            raise pickle.UnpicklingError(f'{module}.{name} is not allowed in a game file')
+        return super().find_class(module, name)
+
+
+def load_game(f: io.BufferedIOBase, mapped: bool = True) -> dict:
+    """Returns the same keys that version 1 game files had, with `'board'` in place of `'grid'`.
+
+    `mapped` lets big games be memory mapped, which keeps the file open until the game is closed
+    """
+    magic = f.read(len(MAGIC))
+    f.seek(0)
+    if magic == MAGIC:
+        reader = GameReader(f)
+        header = reader.header
+        board = reader.read(mapped)
+        return {
+            'start': header.start,
+            'time played': header.time_played,
+            'board': board,
+            'num mines': board.num_mines,
+            'chording': header.chording,
+            'difficulty': header.grid_size,
+        }
+
+    data = LegacyUnpickler(f).load()
+    data['board'] = data.pop('grid').to_board(data.get('num mines', -1))
+    data['num mines'] = data['board'].num_mines
+    return data
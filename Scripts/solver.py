@@ -0,0 +1,232 @@
+"""Finds the squares that can be proven safe or proven to be mines from what the player can see.
+
+Every revealed number is a constraint: its hidden neighbors hold exactly that many mines. The
+solver only keeps constraints for the numbers on the edge of the opened area and only looks
+at the constraints that changed since the last move, so it can run after every click:
+
+- a constraint with no mines left makes all its squares safe, one with as many mines as
+  squares makes all of them mines
+- two constraints that share squares are compared, ie: if one is a subset of the other the
+  squares only in the bigger one hold the difference
+- the number of mines left on the board is used once the constraints run out
+
+The player's flags are never trusted, the solver keeps track of the mines it proved itself.
+"""
+from collections import deque
+from typing import Callable, Iterable
+from .board import Board
+from .chunks import ChunkedBoard
+
+
+class Constraint:
+    """`mines` of the squares in `cells` are mines"""
+    __slots__ = ('cells', 'mines')
+
+    def __init__(self, cells: set[int], mines: int) -> None:
+        self.cells = cells
+        self.mines = mines
+
+
+class Solver:
+    def __init__(self, board: Board) -> None:
+        self.board = board
+        # Squares that were proven, safe squares are removed once they are revealed
+        self.mines: set[int] = set()
+        self.safe: set[int] = set()
+        # Keyed by the number the constraint came from
+        self.constraints: dict[int, Constraint] = {}
+        # Hidden square to the constraints it is in
+        self.watchers: dict[int, set[int]] = {}
+        self.queue: deque[int] = deque()
+        self.queued: set[int] = set()
+        self.update(board.revealed_indexes())
+
+    def update(self, changed: Iterable[int]):
+        """Takes in the squares that changed since the last update, only revealed ones matter"""
+        board = self.board
+        opened = [index for index in changed if board.revealed[index]]
+        for index in opened:
+            if board.exploded == index:
+                self.mark_mine(index)
+            else:
+                self.safe.discard(index)
+                self.resolve(index, False)
+        for index in opened:
+            if board.exploded != index:
+                self.add_constraint(index)
+        self.propagate()
+
+    def is_unknown(self, index: int) -> bool:
+        return not self.board.revealed[index] and index not in self.mines and index not in self.safe
+
+    def add_constraint(self, index: int):
+        count = self.board.counts[index]
+        if not count or index in self.constraints:
+            return
+        cells = set()
+        for index2 in self.board.neighbors(index):
+            if index2 in self.mines:
+                count -= 1
+            elif self.is_unknown(index2):
+                cells.add(index2)
+        if not cells:
+            return
+        self.constraints[index] = Constraint(cells, count)
+        for cell in cells:
+            self.watchers.setdefault(cell, set()).add(index)
+        self.enqueue(index)
+
+    def enqueue(self, key: int):
+        if key not in self.queued:
+            self.queued.add(key)
+            self.queue.append(key)
+
+    def resolve(self, cell: int, mine: bool):
+        """Takes a square that was proven out of every constraint it is in"""
+        for key in self.watchers.pop(cell, ()):
+            constraint = self.constraints[key]
+            constraint.cells.discard(cell)
+            constraint.mines -= mine
+            self.enqueue(key)
+
+    def mark_safe(self, cell: int):
+        if self.is_unknown(cell):
+            self.safe.add(cell)
+            self.resolve(cell, False)
+
+    def mark_mine(self, cell: int):
+        if cell not in self.mines:
+            self.mines.add(cell)
+            self.resolve(cell, True)
+
+    def propagate(self):
+        while True:
+            while self.queue:
+                key = self.queue.popleft()
+                self.queued.discard(key)
+                constraint = self.constraints.get(key)
+                if constraint != None:
+                    self.check(key, constraint)
+            if not self.check_global():
+                return
+
+    def check(self, key: int, constraint: Constraint):
+        cells = constraint.cells
+        if not cells:
+            del self.constraints[key]
+        elif constraint.mines == 0:
+            for cell in list(cells):
+                self.mark_safe(cell)
+        elif constraint.mines == len(cells):
+            for cell in list(cells):
+                self.mark_mine(cell)
+        else:
+            others = set()
+            for cell in cells:
+                others.update(self.watchers[cell])
+            others.discard(key)
+            for other in others:
+                if self.compare(constraint, self.constraints[other]):
+                    # The sets changed, the constraints that were touched are queued again
+                    return
+
+    def compare(self, a: Constraint, b: Constraint) -> bool:
+        """Looks for squares that are proven by two overlapping constraints, returns whether any were found"""
+        only_a = a.cells - b.cells
+        only_b = b.cells - a.cells
+        shared = len(a.cells) - len(only_a)
+        for cells, mines, other_cells, other_mines in (
+            (only_a, a.mines, only_b, b.mines),
+            (only_b, b.mines, only_a, a.mines)
+        ):
+            if not cells:
+                continue
+            # The shared squares hold at most this many mines, the rest have to be in `cells`
+            if mines - min(shared, mines, other_mines) == len(cells):
+                for cell in cells:
+                    self.mark_mine(cell)
+                return True
+            # The other constraint needs at least this many mines in the shared squares
+            if mines - max(other_mines - len(other_cells), 0) == 0:
+                for cell in cells:
+                    self.mark_safe(cell)
+                return True
+        return False
+
+    def check_global(self) -> bool:
+        """Uses the number of mines left on the board, returns whether anything was proven"""
+        board = self.board
+        if isinstance(board, ChunkedBoard) or not board.generated:
+            # Looking at every hidden square of a board that is made in chunks would make all of it
+            return False
+        mines_left = board.num_mines - len(self.mines)
+        # A square that exploded is in `mines`, not in `revealed_safe`
+        unknown = board.size - board.revealed_safe - len(self.mines) - len(self.safe)
+        if not unknown:
+            return False
+        if mines_left == 0:
+            self.mark_all(lambda index: True, self.mark_safe)
+            return True
+        if mines_left == unknown:
+            self.mark_all(lambda index: True, self.mark_mine)
+            return True
+        # Constraints that do not share squares need at least their mines between them,
+        # if that is every mine left then no square away from the edge can be a mine
+        interior = unknown - len(self.watchers)
+        if not interior:
+            return False
+        used = set()
+        needed = 0
+        for constraint in self.constraints.values():
+            if used.isdisjoint(constraint.cells):
+                used.update(constraint.cells)
+                needed += constraint.mines
+        if needed == mines_left:
+            self.mark_all(lambda index: index not in self.watchers, self.mark_safe)
+            return True
+        return False
+
+    def mark_all(self, where: Callable[[int], bool], mark: Callable[[int], None]):
+        for index in range(self.board.size):
+            if self.is_unknown(index) and where(index):
+                mark(index)
+
+    def safe_moves(self) -> list[int]:
+        """Returns every square that is proven safe and can be clicked"""
+        flagged = self.board.flagged
+        return sorted(index for index in self.safe if not flagged[index])
+
+    def hint(self) -> int | None:
+        """Returns a square that is safe to click, or `None` if the next move has to be a guess"""
+        if not self.board.generated:
+            # The first click is always safe
+            return self.board.index(self.board.rows // 2, self.board.cols // 2)
+        moves = self.safe_moves()
+        return moves[0] if moves else None
+
+    def solve(self, reveal: Callable[[int], list[int]] | None = None) -> list[int]:
+        """Clicks proven safe squares until the board is won or the next move has to be a guess.
+
+        `reveal` does the click and returns the squares that changed, it is `board.reveal` by default
+        """
+        board = self.board
+        changed = []
+        while not board.is_won() and not board.is_lost():
+            moves = self.safe_moves() if board.generated else [self.hint()]
+            if not moves:
+                break
+            opened_before = len(changed)
+            for index in moves:
+                if board.revealed[index]:
+                    continue
+                if reveal == None:
+                    opened = board.reveal(index)
+                    self.update(opened)
+                else:
+                    # `reveal` has to update the solver itself, ie: `ButtonGrid.reveal`
+                    opened = reveal(index)
+                changed += opened
+            if len(changed) == opened_before:
+                # Nothing was opened, ie: `reveal` did not click, so the next pass would be the same
+                break
+        return changed
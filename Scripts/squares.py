@@ -1,6 +1,7 @@
 from tkinter import *
 from .load_font import load_font
-from .constants import DEFAULT_BG, DARK_MODE_BG
+from .constants import DEFAULT_BG, DARK_MODE_BG, SQUARE_SIZE, MIN_SQUARE_SIZE, MAX_SQUARE_SIZE
+from .board import Board
 
 font_family, font_name = load_font(r"data\fonts\DSEG7ClassicMini-Bold.ttf")
 
@@ -15,6 +16,9 @@ num_colors = {
     8: 'gray',
 }
 
+HIDDEN_BG = '#c0c0c0'
+HIDDEN_DARK_MODE_BG = '#3c3c3c'
+
 dark_mode_colors = {
     1: 'DarkBlue',
     2: 'DarkGreen',
@@ -27,80 +31,189 @@ dark_mode_colors = {
 }
 
 
-class Square(Button):
-    def __init__(self, master: Misc | None = ..., text='') -> None:
-        self.category: str | None = None
-        self.num: int | None = None
-        self.game_over = False
-        self.flaged = False
-        self.position: tuple[int, int]
-        self.chord: bool = False
-        self.completed: bool = False
-        self.clicked_on: bool = False
-        self.dark_mode: bool = False
+class SquareCanvas(Canvas):
+    """Draws the squares of a `Board` that are in view on one canvas.
+
+    Each visible square is a rectangle and a text item tagged `s{index}`. Items are only
+    made for the squares that can be seen and are reused when the view is scrolled or
+    resized, so drawing costs depend on the window size and not on the board size
+    """
+
+    def __init__(self, master: Misc | None, board: Board, square_size: int = SQUARE_SIZE, dark_mode: bool = False) -> None:
+        self.board = board
+        self.square_size = square_size
+        self.dark_mode = dark_mode
+        self.font = (font_name, max(square_size//2 - 2, 4))
+        super().__init__(
+            master,
+            width=min(board.cols * square_size, int(master.winfo_screenwidth() * 0.9)),
+            height=min(board.rows * square_size, int(master.winfo_screenheight() * 0.75)),
+            highlightthickness=0,
+            bg=DARK_MODE_BG if dark_mode else DEFAULT_BG
+        )
+        self.visible: dict[int, tuple[int, int]] = {}
+        self.spare: list[tuple[int, int]] = []
+        # Colors and text that replace what the board would show, ie: highlighted chords and results
+        self.marks: dict[int, tuple[str | None, str | None]] = {}
+        self.set_scrollregion()
+
+        self.bind('<Configure>', lambda _: self.update_view())
+        self.bind('<MouseWheel>', lambda e: self.yview_scroll(-e.delta//120, 'units'))
+        self.bind('<Shift-MouseWheel>', lambda e: self.xview_scroll(-e.delta//120, 'units'))
+        self.bind('<Control-MouseWheel>', lambda e: self.zoom(1 if e.delta > 0 else -1))
+
+    def set_scrollregion(self):
+        size = self.square_size
+        self.config(
+            scrollregion=(0, 0, self.board.cols * size, self.board.rows * size),
+            xscrollincrement=size,
+            yscrollincrement=size
+        )
+
+    def attach_scrollbars(self, xbar: Scrollbar, ybar: Scrollbar):
+        def scrolled(bar: Scrollbar, *args):
+            bar.set(*args)
+            self.update_view()
+
+        self.config(xscrollcommand=lambda *args: scrolled(xbar, *args), yscrollcommand=lambda *args: scrolled(ybar, *args))
+        xbar.config(command=self.xview)
+        ybar.config(command=self.yview)
+
+    def view_range(self) -> tuple[int, int, int, int]:
+        """Returns the first and last (exclusive) rows and columns that can be seen"""
+        size = self.square_size
+        left = int(self.canvasx(0)) // size
+        top = int(self.canvasy(0)) // size
+        right = int(self.canvasx(self.winfo_width())) // size + 1
+        bottom = int(self.canvasy(self.winfo_height())) // size + 1
+        return max(top, 0), min(bottom, self.board.rows), max(left, 0), min(right, self.board.cols)
+
+    def update_view(self):
+        """Draws the squares that scrolled into view, using the items of the ones that scrolled out"""
+        top, bottom, left, right = self.view_range()
+        cols = self.board.cols
+        for index in list(self.visible):
+            row, col = divmod(index, cols)
+            if not (top <= row < bottom and left <= col < right):
+                items = self.visible.pop(index)
+                self.itemconfigure(items[0], state='hidden')
+                self.itemconfigure(items[1], state='hidden')
+                self.spare.append(items)
+
+        size = self.square_size
+        half = size / 2
+        for row in range(top, bottom):
+            for col in range(left, right):
+                index = row * cols + col
+                if index in self.visible:
+                    continue
+                x = col * size
+                y = row * size
+                tags = ('square', f's{index}')
+                if self.spare:
+                    rect, text = self.spare.pop()
+                    self.coords(rect, x, y, x + size, y + size)
+                    self.coords(text, x + half, y + half)
+                    self.itemconfigure(rect, state='normal', tags=tags)
+                    self.itemconfigure(text, state='normal', tags=tags)
+                else:
+                    rect = self.create_rectangle(x, y, x + size, y + size, outline='gray', tags=tags)
+                    text = self.create_text(x + half, y + half, font=self.font, tags=tags)
+                self.visible[index] = (rect, text)
+                self.draw(index)
 
-        super().__init__(master, text=text, font=(font_name, 12))
+    def zoom(self, step: int):
+        """Makes the squares bigger or smaller while keeping the middle of the view in place"""
+        size = min(max(self.square_size + step * 2, MIN_SQUARE_SIZE), MAX_SQUARE_SIZE)
+        if size == self.square_size:
+            return
+        x = (self.canvasx(self.winfo_width()/2)) / self.square_size
+        y = (self.canvasy(self.winfo_height()/2)) / self.square_size
+        self.square_size = size
+        self.font = (font_name, max(size//2 - 2, 4))
+        self.delete('square')
+        self.visible.clear()
+        self.spare.clear()
+        self.set_scrollregion()
+        self.xview_moveto(max(x * size - self.winfo_width()/2, 0) / (self.board.cols * size))
+        self.yview_moveto(max(y * size - self.winfo_height()/2, 0) / (self.board.rows * size))
+        self.update_view()
 
-        self.bind('<Button-1>', self.clicked)
-        self.bind('<Button-2>', self.chord_self)
-        self.bind('<Button-3>', self.flag)
+    def square_at(self, x: int, y: int) -> int | None:
+        """Returns the index of the square under a point of the widget"""
+        row = int(self.canvasy(y)) // self.square_size
+        col = int(self.canvasx(x)) // self.square_size
+        if 0 <= row < self.board.rows and 0 <= col < self.board.cols:
+            return self.board.index(row, col)
+        return None
 
-    def flag(self, _=None):
-        if self.cget('text').replace(' ', '') == '':
+    def look(self, index: int) -> tuple[str, str, str]:
+        """Returns the background, foreground and text of a square"""
+        board = self.board
+        if board.flagged[index]:
             if self.dark_mode:
-                self.config(fg='white')
-            else:
-                self.config(fg='black')
-            self.config(text='🚩')
-            self.clicked_on = True
-            self.flaged = True
-        elif self.cget('text') == '🚩':
+                return HIDDEN_DARK_MODE_BG, 'white', '🚩'
+            return HIDDEN_BG, 'black', '🚩'
+        elif not board.revealed[index]:
             if self.dark_mode:
-                self.config(fg='black')
-            self.config(text="   " * 3)
-            self.clicked_on = False
-            self.flaged = False
-
-    def chord_self(self, _=None):
-        self.chord = not self.chord
-
-    def clicked(self, _=None):
-        if self.category == 'mine':
-            self.config(text='💣', bg='red')
-            self.game_over = True
-        elif self.num != None:
+                return HIDDEN_DARK_MODE_BG, 'white', ''
+            return HIDDEN_BG, 'black', ''
+        elif board.mines[index]:
+            return 'red', 'black', '💣'
+        elif board.counts[index]:
+            num = board.counts[index]
             if self.dark_mode:
-                self.config(text=str(self.num), bg=dark_mode_colors[self.num], fg=DARK_MODE_BG)
-            else:
-                self.config(text=str(self.num), bg=num_colors[self.num], fg='black')
+                return dark_mode_colors[num], DARK_MODE_BG, str(num)
+            return num_colors[num], 'black', str(num)
+        elif self.dark_mode:
+            return DARK_MODE_BG, 'white', '0'
         else:
-            if self.dark_mode:
-                self.config(bg=DARK_MODE_BG)
-            else:
-                self.config(bg=DEFAULT_BG)
-            self.config(text='0')
-        self.clicked_on = True
-    
+            return DEFAULT_BG, 'black', '0'
+
+    def draw(self, index: int):
+        bg, fg, text = self.look(index)
+        if index in self.marks:
+            mark_bg, mark_text = self.marks[index]
+            bg = mark_bg or bg
+            text = mark_text or text
+        rect, text_item = self.visible[index]
+        self.itemconfigure(rect, fill=bg)
+        self.itemconfigure(text_item, fill=fg, text=text, font=self.font)
+
+    def redraw(self, indexes):
+        """Redraws the squares that changed, squares out of view are drawn when they are scrolled to"""
+        visible = self.visible
+        for index in indexes:
+            if index in visible:
+                self.draw(index)
+
+    def mark(self, indexes, bg: str | None = None, text: str | None = None):
+        for index in indexes:
+            self.marks[index] = (bg, text)
+        self.redraw(indexes)
+
+    def unmark(self, indexes):
+        for index in indexes:
+            self.marks.pop(index, None)
+        self.redraw(indexes)
+
+    def highlight(self, indexes, color: str):
+        self.mark(indexes, bg=color)
+
+    def show_mine(self, index: int):
+        self.mark([index], 'red', '💣')
+
+    def set_text(self, index: int, text: str):
+        self.mark([index], text=text)
+
     def switch_theme(self):
         self.dark_mode = not self.dark_mode
-        if not self.dark_mode:
-            if self.clicked_on and self.num != None:
-                self.config(bg=num_colors[self.num])
-            elif self.flaged:
-                self.config(fg='black', bg=DEFAULT_BG)
-            else:
-                self.config(bg=DEFAULT_BG)
-        elif self.dark_mode:
-            if self.clicked_on and self.num != None:
-                self.config(bg=dark_mode_colors[self.num])
-            elif self.flaged:
-                self.config(fg='white', bg=DARK_MODE_BG)
-            else:
-                self.config(bg=DARK_MODE_BG)
+        self.config(bg=DARK_MODE_BG if self.dark_mode else DEFAULT_BG)
+        self.redraw(list(self.visible))
 
 
 class PickleSquare:
-    """Same as `Square` but is used to pickle and save data"""
+    """One square of a version 1 game file, only kept so they can still be opened"""
 
     def __init__(self, category: str, position: tuple[int, int], num, chord=False, completed=False, clicked_on=False, game_over=False, flaged:bool = False, dark_mode:bool = False) -> None:
         self.chord: bool = chord
@@ -112,23 +225,3 @@ class PickleSquare:
         self.num = num
         self.flaged = flaged
         self.dark_mode = dark_mode
-
-    def to_square(self, master) -> Square:
-        square = Square(master)
-        for key, value in self.__dict__.items():
-            square.__dict__[key] = value
-        return square
-
-    @classmethod
-    def from_square(cls, square: Square):
-        return cls(
-            square.category,
-            square.position,
-            square.num,
-            square.chord,
-            square.completed,
-            square.clicked_on,
-            square.game_over,
-            square.flaged,
-            square.dark_mode
-        )
@@ -0,0 +1,320 @@
+"""Load test for the multiplayer server, everything runs on this computer.
+
+Starts `server.py` on a local port (or uses one that is already running with `--no-server`)
+and connects simulated clients to it. Every client plays games with random moves at about
+`--rate` moves a second, starts a new game when it wins or loses, and sometimes drops its
+connection and resumes the game like a player with bad internet would.
+
+The time from sending a move to getting the delta for it is the latency of that move. At the
+end the p50 and p99 latency, the messages a second, the memory the server used and the
+errors are printed. It exits with 1 if there were any errors so it can be used in CI.
+
+    python load_test.py --clients 2000 --rate 2 --duration 30 --workers 4
+    python load_test.py --clients 2000 --mines 40 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from Scripts import protocol
+from Scripts.journal import REVEAL, FLAG
+
+READ_SIZE = 65536
+# Seconds to wait for the server to answer before it counts as an error
+ANSWER_TIMEOUT = 10
+# Connections opened at the same time, more than this overflows the server's backlog
+CONNECTING = 200
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+        self.sent = 0
+        self.received = 0
+        self.games = 0
+        self.reconnects = 0
+        self.errors: Counter[str] = Counter()
+        self.elapsed = 0.0
+        self.peak_memory: int | None = None
+
+
+class SimulatedClient:
+    def __init__(self, host: str, port: int, options: argparse.Namespace, stats: Stats, connecting: asyncio.Semaphore) -> None:
+        self.host = host
+        self.port = port
+        self.options = options
+        self.stats = stats
+        self.connecting = connecting
+        self.writer: asyncio.StreamWriter | None = None
+        self.reading: asyncio.Task | None = None
+        self.answer: asyncio.Future | None = None
+        self.game_id = 0
+        self.player = 0
+        self.token = b''
+        self.grid_size = (0, 0)
+        self.num_mines = 0
+        self.sequences = {1: 0, 2: 0}
+        # How every square of this client's board looks, kept up to date from the deltas
+        self.states = bytearray()
+        self.finished = False
+        self.opponent_seen = False
+
+    async def open(self, hello: bytes):
+        """Connects and says hello, following redirects to the worker the game is on"""
+        port = self.port
+        async with self.connecting:
+            while True:
+                reader, writer = await asyncio.open_connection(self.host, port)
+                writer.write(hello)
+                self.stats.sent += 1
+                frames = protocol.FrameReader()
+                messages = []
+                while not messages:
+                    data = await asyncio.wait_for(reader.read(READ_SIZE), ANSWER_TIMEOUT)
+                    if not data:
+                        raise ConnectionError('The server closed the connection during the hello')
+                    messages.extend(frames.feed(data))
+                self.stats.received += 1
+                kind, body = messages.pop(0)
+                if kind == protocol.REDIRECT:
+                    writer.close()
+                    port = protocol.REDIRECT_BODY.unpack(body)[0]
+                    continue
+                if kind == protocol.ERROR:
+                    writer.close()
+                    raise protocol.ProtocolError(body.decode('utf-8', 'replace'))
+                break
+        _, self.game_id, self.player, self.token, rows, cols, self.num_mines = protocol.WELCOME_BODY.unpack(body)
+        self.grid_size = (rows, cols)
+        self.writer = writer
+        for kind, body in messages:
+            self.handle_message(kind, body)
+        self.reading = asyncio.create_task(self.read_loop(reader, frames))
+
+    async def close(self):
+        if self.writer != None:
+            self.writer.close()
+            self.writer = None
+        if self.reading != None:
+            self.reading.cancel()
+            try:
+                await self.reading
+            except asyncio.CancelledError:
+                pass
+            self.reading = None
+
+    async def read_loop(self, reader: asyncio.StreamReader, frames: protocol.FrameReader):
+        try:
+            while data := await reader.read(READ_SIZE):
+                for kind, body in frames.feed(data):
+                    self.handle_message(kind, body)
+        except ConnectionError:
+            pass
+        if self.answer != None and not self.answer.done():
+            self.answer.set_exception(ConnectionError('The server closed the connection'))
+
+    def handle_message(self, kind: int, body: bytes):
+        self.stats.received += 1
+        if kind == protocol.DELTA:
+            (sequence, player, revealed, flags, exploded), changes = protocol.decode_delta(body)
+            self.sequences[player] = sequence
+            if player != self.player:
+                self.opponent_seen = True
+                return
+            for index, state in changes:
+                self.states[index] = state
+            self.update(revealed, exploded)
+        elif kind == protocol.SNAPSHOT:
+            (player, _, _, _, sequence, revealed, flags, exploded), states = protocol.decode_snapshot(body)
+            self.sequences[player] = sequence
+            if player == self.player:
+                self.states[:] = states
+                self.update(revealed, exploded)
+        elif kind == protocol.ERROR:
+            self.stats.errors[body.decode('utf-8', 'replace')] += 1
+
+    def update(self, revealed: int, exploded: int):
+        rows, cols = self.grid_size
+        if exploded != -1 or revealed == rows * cols - self.num_mines:
+            self.finished = True
+        if self.answer != None and not self.answer.done():
+            self.answer.set_result(None)
+
+    def pick_move(self) -> tuple[int, int]:
+        """A move that always changes the board, so the server always answers it"""
+        hidden = [index for index, state in enumerate(self.states) if not state & protocol.REVEALED]
+        index = random.choice(hidden)
+        if random.random() < self.options.flags or self.states[index] & protocol.FLAGGED:
+            return FLAG, index
+        return REVEAL, index
+
+    async def play_move(self):
+        self.answer = asyncio.get_running_loop().create_future()
+        self.writer.write(protocol.encode_moves([self.pick_move()]))
+        self.stats.sent += 1
+        start = time.perf_counter()
+        await asyncio.wait_for(self.answer, ANSWER_TIMEOUT)
+        self.stats.latencies.append(time.perf_counter() - start)
+
+    async def play_game(self, until: float):
+        rows, cols = self.options.grid_size
+        self.states = bytearray(rows * cols)
+        self.sequences = {1: 0, 2: 0}
+        self.finished = self.opponent_seen = False
+        await self.open(protocol.hello(self.options.grid_size, self.options.mines))
+        while not self.finished:
+            wait = random.expovariate(self.options.rate)
+            if time.perf_counter() + wait > until:
+                break
+            await asyncio.sleep(wait)
+            await self.play_move()
+            # A player that is still waiting for an opponent has nothing to resume
+            if self.opponent_seen and random.random() < self.options.reconnect:
+                await self.close()
+                self.stats.reconnects += 1
+                await self.open(protocol.resume(self.game_id, self.player, self.token, (self.sequences[1], self.sequences[2])))
+        if self.finished:
+            self.stats.games += 1
+        await self.close()
+
+    async def run(self, until: float):
+        # Spread out the first moves of the clients
+        await asyncio.sleep(random.random() / self.options.rate)
+        while time.perf_counter() < until:
+            try:
+                await self.play_game(until)
+            except asyncio.TimeoutError:
+                self.stats.errors['No answer in time'] += 1
+            except (ConnectionError, OSError, protocol.ProtocolError) as e:
+                self.stats.errors[f'{type(e).__name__}: {e}'] += 1
+            finally:
+                await self.close()
+
+
+def memory(pid: int) -> int | None:
+    """Bytes used by a process and its children, or `None` if it cannot be read (not Linux)"""
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            used = next(int(line.split()[1]) * 1024 for line in status if line.startswith('VmRSS:'))
+        with open(f'/proc/{pid}/task/{pid}/children') as children:
+            child_pids = [int(child) for child in children.read().split()]
+    except (OSError, StopIteration):
+        return None
+    return used + sum(memory(child) or 0 for child in child_pids)
+
+
+async def watch_memory(pid: int, peak: list[int]):
+    while True:
+        used = memory(pid)
+        if used != None:
+            peak[0] = max(peak[0], used)
+        await asyncio.sleep(0.5)
+
+
+async def wait_for_server(host: str, port: int, timeout: float = 10):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def raise_open_file_limit(wanted: int):
+    """Every client is a socket, the default limit is often only 1024"""
+    try:
+        import resource
+    except ImportError:
+        # Windows does not have a limit like this
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+
+async def load_test(options: argparse.Namespace, server_pid: int | None) -> Stats:
+    stats = Stats()
+    connecting = asyncio.Semaphore(CONNECTING)
+    await wait_for_server(options.host, options.port)
+    peak = [0]
+    watching = asyncio.create_task(watch_memory(server_pid, peak)) if server_pid != None else None
+    start = time.perf_counter()
+    until = start + options.duration
+    clients = [SimulatedClient(options.host, options.port, options, stats, connecting) for _ in range(options.clients)]
+    await asyncio.gather(*(client.run(until) for client in clients))
+    stats.elapsed = time.perf_counter() - start
+    if watching != None:
+        watching.cancel()
+    stats.peak_memory = peak[0] or None
+    return stats
+
+
+def report(options: argparse.Namespace, stats: Stats):
+    elapsed = stats.elapsed
+    print(f'{options.clients} clients for {elapsed:.1f} s, {options.rate:g} moves a second each')
+    if len(stats.latencies) > 1:
+        percentiles = statistics.quantiles(stats.latencies, n=100)
+        print(f'Moves: {len(stats.latencies)} ({len(stats.latencies) / elapsed:.0f}/s), '
+              f'p50 {percentiles[49] * 1000:.2f} ms, p99 {percentiles[98] * 1000:.2f} ms')
+    else:
+        print('Moves: not enough to measure latency')
+    messages = stats.sent + stats.received
+    print(f'Messages: {messages} ({messages / elapsed:.0f}/s), {stats.sent} sent, {stats.received} received')
+    print(f'Games finished: {stats.games} ({stats.games / elapsed:.1f}/s), reconnects: {stats.reconnects}')
+    if stats.peak_memory != None:
+        print(f'Server memory: {stats.peak_memory / 2**20:.1f} MB at most')
+    print(f'Errors: {sum(stats.errors.values())}')
+    for error, count in stats.errors.most_common():
+        print(f'    {count} x {error}')
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Load test the multiplayer server on this computer')
+    parser.add_argument('--clients', type=int, default=1000, help='simulated clients')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run for')
+    parser.add_argument('--rate', type=float, default=2, help='moves a second for each client')
+    parser.add_argument('--flags', type=float, default=0.2, help='chance a move is a flag instead of a reveal')
+    parser.add_argument('--reconnect', type=float, default=0.01, help='chance a client drops its connection and resumes after a move')
+    parser.add_argument('--size', default='16x16', help='rows x cols of the games played')
+    parser.add_argument('--mines', type=int, default=-1, help='mines in the games played, -1 is the default for the size')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes of the server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5700)
+    parser.add_argument('--no-server', action='store_true', help='use a server that is already running')
+    options = parser.parse_args()
+    options.grid_size = tuple(int(size) for size in options.size.lower().split('x'))
+    return options
+
+
+def main():
+    options = parse_arguments()
+    raise_open_file_limit(options.clients + 256)
+    server = None
+    if not options.no_server:
+        server = subprocess.Popen(
+            [sys.executable, 'server.py', options.host, str(options.workers), str(options.port)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL
+        )
+    try:
+        stats = asyncio.run(load_test(options, server.pid if server != None else None))
+    finally:
+        if server != None:
+            # An interrupt lets the server stop its workers too
+            server.send_signal(signal.SIGINT if os.name != 'nt' else signal.SIGTERM)
+            server.wait()
+    report(options, stats)
+    sys.exit(1 if stats.errors else 0)
+
+
+if __name__ == '__main__':
+    main()
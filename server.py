@@ -1,10 +1,37 @@
-"""Soon going to the server for online multiplayer pit mopper games.
-Multiplayer games will most likely not coming anytime soon
+"""Server for online multiplayer pit mopper games.
+
+Every connection is a coroutine so one process can hold thousands of clients. Clients are
+paired up by the size of game they want, the first of each pair waits in a new `OnlineGame`
+for the second. The server owns the boards: players send moves, the server checks them and
+sends the squares that changed to both players and everyone watching the game. A player that
+loses their connection can resume the game with the token they got when they joined.
+What is sent to a client goes through a bounded buffer, a client that stops reading and lets
+it fill up is disconnected instead of using more and more memory. Messages that are waiting
+when the client can be written to again are sent together.
+
+On Linux the server runs a worker process for every core, they all listen on the same port
+with `SO_REUSEPORT` so the kernel spreads new connections over them. A game stays on the
+worker that made it, its id tells which one. Every worker also listens on a port of its own,
+a client that reaches the wrong worker is redirected there. Players waiting for a second
+player are known to the coordinator in the main process, so a player is paired with one
+waiting on another worker instead of waiting too.
+
+See `Scripts/protocol.py` for the messages.
 """
+import asyncio
+import logging
+import multiprocessing
+import os
+import secrets
 import socket
-from _thread import *
 import sys
+from functools import partial
+from collections import deque
+from typing import AsyncIterator
+from Scripts.board import default_mines
+from Scripts.constants import MIN_ROWS_AND_COLS
 from Scripts.game import OnlineGame
+from Scripts import protocol
 
 server = '192.168.2.13' # This may look like I mistakenly put my IP address here but its not
 # This is local address which means that it can only be used in my WIFI network
@@ -12,58 +39,450 @@ server = '192.168.2.13' # This may look like I mistakenly put my IP address here
 
 port = 5555
 
-s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+# Bytes that can be waiting to be sent to one client
+SEND_BUFFER_SIZE = 1 << 20
+READ_SIZE = 65536
+LOG_FORMAT = '%(asctime)s %(processName)s [%(levelname)s]: %(message)s'
+# Seconds a client has to say hello before it is disconnected
+HELLO_TIMEOUT = 10
+# Seconds a game is kept after both players lost their connection, so they can resume it
+RECONNECT_SECONDS = 60
+# The server keeps every board in memory, so online games are kept small
+MAX_ONLINE_ROWS_AND_COLS = 100
 
-try:
-    s.bind((server, port))
-except socket.error as e:
-    sys.stderr.write(e)
-else:
-    print('Socket binded successfully')
 
+def game_key(grid_size: tuple[int, int], num_mines: int) -> tuple[tuple[int, int], int]:
+    """Players are paired by this, -1 mines is the default for the size so it has to be worked out first"""
+    if num_mines == -1:
+        num_mines = default_mines(grid_size)
+    return tuple(grid_size), num_mines
 
-s.listen()
-print('Waiting for connection...')
 
-games:dict[int, OnlineGame] = {}
-id_count = 0
+class Client:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, game: OnlineGame | None, player: int) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.game = game
+        self.player = player
+        self.address = writer.get_extra_info('peername')
+        self.pending: deque[bytes] = deque()
+        self.pending_size = 0
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.aborted = False
 
-def new_client(conn:socket.socket):
-    reply = 'random reply'
-    conn.send('Connected'.encode())
-    while True:
-        try:
-            data = conn.recv(2048)
-            recieved = data.decode('utf-8')
-            
+    def send(self, data: bytes):
+        """Queues a message, the client is disconnected if it is too far behind"""
+        if self.closed:
+            return
+        if self.pending_size + len(data) > SEND_BUFFER_SIZE:
+            logging.warning(f'{self.address} is not reading what is sent to it, disconnecting')
+            self.close(abort=True)
+            return
+        self.pending.append(data)
+        self.pending_size += len(data)
+        self.ready.set()
+
+    def close(self, abort: bool = False):
+        """Stops sending once what is queued is sent, `abort` drops it instead"""
+        if abort and not self.aborted:
+            self.aborted = True
+            self.pending.clear()
+            self.writer.transport.abort()
+        self.closed = True
+        self.ready.set()
+
+    async def write_loop(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            if self.pending and not self.aborted:
+                data = b''.join(self.pending)
+                self.pending.clear()
+                self.pending_size = 0
+                try:
+                    self.writer.write(data)
+                    await self.writer.drain()
+                except ConnectionError:
+                    self.close(abort=True)
+            if self.closed and not self.pending:
+                if not self.aborted:
+                    self.writer.close()
+                return
+
+    async def messages(self) -> AsyncIterator[tuple[int, bytes]]:
+        frames = protocol.FrameReader()
+        while not self.closed:
+            data = await self.reader.read(READ_SIZE)
             if not data:
-                print('Client Disconnected')
-                break
-            else:
-                print('Received: ', recieved)
-                print('Sending: ', reply)
-            
-            conn.sendall(reply.encode('utf-8'))
-
-        except Exception as e:
-            sys.stderr.write(e + '\nUnknown error with client, disconnecting immeidietly')
-            break
-
-    print('Disconnecting...')
-    conn.close()
-
-
-while True:
-    conn, addr = s.accept()
-    print('Connected to: ', addr)
-
-    id_count += 1
-    game_id = (id_count - 1)//2
-    if id_count % 2 == 1:
-        print('Creating new game...')
-        game = None
-        games[game_id] = game
-    else:
-        game = games[game_id]
-
-    start_new_thread(new_client, (), {'conn':conn})
+                return
+            for message in frames.feed(data):
+                yield message
+
+
+class CoordinatorLink:
+    """A worker's connection to the coordinator"""
+
+    def __init__(self, worker: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.worker = worker
+        self.reader = reader
+        self.writer = writer
+        self.requests: dict[int, asyncio.Future[int]] = {}
+        self.next_request = 0
+        self.closed = False
+
+    @classmethod
+    async def connect(cls, worker: int, port: int) -> 'CoordinatorLink':
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        link = cls(worker, reader, writer)
+        asyncio.create_task(link.read_loop())
+        return link
+
+    async def find(self, grid_size: tuple[int, int], num_mines: int) -> int:
+        """Returns another worker with a player waiting for this game, or -1 if there is none"""
+        if self.closed:
+            return -1
+        request = self.next_request
+        self.next_request += 1
+        future = asyncio.get_running_loop().create_future()
+        self.requests[request] = future
+        self.writer.write(protocol.frame(protocol.FIND, protocol.FIND_BODY.pack(request, *grid_size, num_mines)))
+        return await future
+
+    def waiting(self, grid_size: tuple[int, int], num_mines: int, waiting: bool):
+        """Tells the coordinator whether a player is waiting for this game on this worker"""
+        if self.closed:
+            return
+        body = protocol.WAITING_BODY.pack(self.worker, *grid_size, num_mines, waiting)
+        self.writer.write(protocol.frame(protocol.WAITING, body))
+
+    async def read_loop(self):
+        frames = protocol.FrameReader()
+        while data := await self.reader.read(READ_SIZE):
+            for kind, body in frames.feed(data):
+                if kind == protocol.FOUND:
+                    request, worker = protocol.FOUND_BODY.unpack(body)
+                    self.requests.pop(request).set_result(worker)
+        logging.error('Lost the connection to the coordinator, players are only paired on this worker now')
+        self.closed = True
+        for future in self.requests.values():
+            future.set_result(-1)
+        self.requests.clear()
+
+
+class Coordinator:
+    """Knows which workers have a player waiting for which game"""
+
+    def __init__(self) -> None:
+        # `(grid size, mines)` to the workers with a player waiting for it
+        self.waiting: dict[tuple[tuple[int, int], int], set[int]] = {}
+
+    def find(self, worker: int, key: tuple[tuple[int, int], int]) -> int:
+        return next((other for other in self.waiting.get(key, ()) if other != worker), -1)
+
+    async def handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        frames = protocol.FrameReader()
+        worker = -1
+        try:
+            while data := await reader.read(READ_SIZE):
+                for kind, body in frames.feed(data):
+                    if kind == protocol.WAITING:
+                        worker, rows, cols, num_mines, waiting = protocol.WAITING_BODY.unpack(body)
+                        workers = self.waiting.setdefault(((rows, cols), num_mines), set())
+                        if waiting:
+                            workers.add(worker)
+                        else:
+                            workers.discard(worker)
+                    elif kind == protocol.FIND:
+                        request, rows, cols, num_mines = protocol.FIND_BODY.unpack(body)
+                        found = self.find(worker, ((rows, cols), num_mines))
+                        writer.write(protocol.frame(protocol.FOUND, protocol.FOUND_BODY.pack(request, found)))
+        except (ConnectionError, protocol.ProtocolError) as e:
+            logging.error(f'Lost worker {worker}: {e}')
+        finally:
+            for workers in self.waiting.values():
+                workers.discard(worker)
+            writer.close()
+
+    async def serve(self) -> asyncio.Server:
+        """Listens on a free port on this computer for the workers"""
+        return await asyncio.start_server(self.handle_worker, '127.0.0.1', 0)
+
+
+class GameServer:
+    def __init__(self, worker: int = 0, workers: int = 1) -> None:
+        self.worker = worker
+        self.workers = workers
+        self.coordinator: CoordinatorLink | None = None
+        self.port = port
+        self.games: dict[int, OnlineGame] = {}
+        # `(game id, player)` to the client playing it
+        self.clients: dict[tuple[int, int], Client] = {}
+        # Game id to the clients watching it
+        self.spectators: dict[int, set[Client]] = {}
+        # `(grid size, mines)` to a game with one player in it, the next client that wants
+        # to play that size joins it
+        self.waiting: dict[tuple[tuple[int, int], int], OnlineGame] = {}
+        # Games nobody is connected to, they are dropped if nobody resumes them in time
+        self.expiring: dict[int, asyncio.TimerHandle] = {}
+        # Ids of a worker's games leave the same remainder when divided by the number of workers
+        self.next_id = worker
+
+    def worker_port(self, worker: int) -> int:
+        """The port only `worker` listens on"""
+        return self.port + 1 + worker
+
+    def owner(self, game_id: int) -> int:
+        """The worker a game is on"""
+        return game_id % self.workers
+
+    def set_waiting(self, game: OnlineGame, waiting: bool):
+        key = (game.grid_size, game.num_mines)
+        if waiting:
+            self.waiting[key] = game
+        else:
+            del self.waiting[key]
+        if self.coordinator != None:
+            self.coordinator.waiting(game.grid_size, game.num_mines, waiting)
+
+    def join(self, grid_size: tuple[int, int], num_mines: int) -> tuple[OnlineGame, int]:
+        if not all(MIN_ROWS_AND_COLS <= size <= MAX_ONLINE_ROWS_AND_COLS for size in grid_size):
+            raise protocol.ProtocolError(f'Online games are {MIN_ROWS_AND_COLS} to {MAX_ONLINE_ROWS_AND_COLS} rows and columns')
+        key = game_key(grid_size, num_mines)
+        game = self.waiting.get(key)
+        if game != None:
+            self.set_waiting(game, False)
+            return game, 2
+        try:
+            game = OnlineGame(self.next_id, *key)
+        except ValueError as e:
+            raise protocol.ProtocolError(str(e))
+        self.next_id += self.workers
+        self.games[game.id] = game
+        self.set_waiting(game, True)
+        logging.info(f'Creating new game {game.id}...')
+        return game, 1
+
+    def resume(self, client: Client, game_id: int, player: int, token: bytes) -> OnlineGame:
+        game = self.games.get(game_id)
+        if game == None or player not in (1, 2) or not secrets.compare_digest(token, game.tokens[player]):
+            raise protocol.ProtocolError('There is no such game to resume')
+        old = self.clients.get((game_id, player))
+        if old != None:
+            # The old connection is probably dead and just has not timed out yet
+            old.game = None
+            old.close(abort=True)
+        expiry = self.expiring.pop(game_id, None)
+        if expiry != None:
+            expiry.cancel()
+        return game
+
+    def watch(self, game_id: int) -> OnlineGame:
+        game = self.games.get(game_id)
+        if game == None:
+            raise protocol.ProtocolError('There is no such game to watch')
+        return game
+
+    def opponent(self, client: Client) -> Client | None:
+        return self.clients.get((client.game.id, 3 - client.player))
+
+    def broadcast(self, game: OnlineGame, message: bytes):
+        """Sends a message to both players and everyone watching"""
+        for player in (1, 2):
+            client = self.clients.get((game.id, player))
+            if client != None:
+                client.send(message)
+        for spectator in self.spectators.get(game.id, ()):
+            spectator.send(message)
+
+    def catch_up(self, client: Client, sequences: tuple[int, int]):
+        for player, sequence in zip((1, 2), sequences):
+            for message in client.game.catch_up(player, sequence):
+                client.send(message)
+
+    def leave(self, client: Client):
+        game = client.game
+        if client.player == 0:
+            self.spectators[game.id].discard(client)
+            return
+        del self.clients[game.id, client.player]
+        if self.waiting.get((game.grid_size, game.num_mines)) is game:
+            # Nobody else has seen the game yet
+            self.set_waiting(game, False)
+            self.drop(game.id)
+            return
+        opponent = self.opponent(client)
+        if opponent != None:
+            opponent.send(protocol.text('Opponent disconnected'))
+        else:
+            self.expiring[game.id] = asyncio.get_running_loop().call_later(RECONNECT_SECONDS, self.drop, game.id)
+
+    def drop(self, game_id: int):
+        self.expiring.pop(game_id, None)
+        del self.games[game_id]
+        for spectator in self.spectators.pop(game_id, ()):
+            spectator.game = None
+            spectator.close()
+        logging.info(f'Game {game_id} is over')
+
+    def handle_message(self, client: Client, kind: int, body: bytes):
+        game = client.game
+        if kind == protocol.TEXT:
+            if client.player == 0:
+                raise protocol.ProtocolError('Spectators cannot send text')
+            game.set_name(client.player, body.decode('utf-8', 'replace'))
+            client.send(protocol.text(game.p2_name if client.player == 1 else game.p1_name))
+        elif kind == protocol.MOVES:
+            if client.player == 0:
+                raise protocol.ProtocolError('Spectators cannot play')
+            delta = game.play(client.player, protocol.decode_moves(body))
+            if delta != None:
+                self.broadcast(game, delta)
+        elif kind == protocol.PING:
+            client.send(protocol.frame(protocol.PONG, body))
+        else:
+            raise protocol.ProtocolError(f'Unexpected message {kind}')
+
+    async def handshake(self, client: Client, messages: AsyncIterator[tuple[int, bytes]]) -> tuple[int, tuple] | None:
+        """Returns what the client wants to do and its details, or `None` if it has to be disconnected"""
+        try:
+            kind, body = await asyncio.wait_for(anext(messages), HELLO_TIMEOUT)
+        except (StopAsyncIteration, asyncio.TimeoutError):
+            return None
+        if kind != protocol.HELLO:
+            raise protocol.ProtocolError('The first message has to be a hello')
+        version, mode, details = protocol.read_hello(body)
+        if version != protocol.VERSION:
+            client.send(protocol.error(f'The server speaks version {protocol.VERSION}, not {version}'))
+            return None
+        return mode, details
+
+    async def elsewhere(self, mode: int, details: tuple, shared: bool) -> int:
+        """Returns the worker the client has to be sent to, or -1 if it stays on this one.
+
+        Clients that came in on this worker's own port were sent here and always stay
+        """
+        if self.workers == 1 or not shared:
+            return -1
+        if mode == protocol.PLAY:
+            rows, cols, num_mines = details
+            key = game_key((rows, cols), num_mines)
+            if key in self.waiting or self.coordinator == None:
+                return -1
+            return await self.coordinator.find(*key)
+        worker = self.owner(details[0])
+        return -1 if worker == self.worker else worker
+
+    async def start(self, client: Client, mode: int, details: tuple, shared: bool) -> bool:
+        """Puts the client in the game it asked for and sends it what it needs to show the game.
+
+        Returns `False` if the client was sent to another worker instead
+        """
+        worker = await self.elsewhere(mode, details, shared)
+        if worker != -1:
+            client.send(protocol.redirect(self.worker_port(worker)))
+            return False
+        token = bytes(8)
+        if mode == protocol.PLAY:
+            rows, cols, num_mines = details
+            client.game, client.player = self.join((rows, cols), num_mines)
+            token = client.game.tokens[client.player]
+            sequences = (0, 0)
+        elif mode == protocol.RESUME:
+            game_id, player, token, *sequences = details
+            client.game, client.player = self.resume(client, game_id, player, token), player
+        else:
+            game_id, *sequences = details
+            client.game, client.player = self.watch(game_id), 0
+        game = client.game
+        if client.player == 0:
+            self.spectators.setdefault(game.id, set()).add(client)
+        else:
+            self.clients[game.id, client.player] = client
+        logging.info(f'Connected to: {client.address}, game {game.id} player {client.player}')
+        client.send(protocol.welcome(game.id, client.player, token, game.grid_size, game.num_mines))
+        self.catch_up(client, sequences)
+        return True
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, shared: bool = True):
+        """`shared` is whether the client connected to the port every worker listens on"""
+        client = Client(reader, writer, None, 0)
+        writing = asyncio.create_task(client.write_loop())
+        messages = client.messages()
+        try:
+            hello = await self.handshake(client, messages)
+            if hello == None or not await self.start(client, *hello, shared):
+                return
+            async for kind, body in messages:
+                self.handle_message(client, kind, body)
+        except ConnectionError as e:
+            logging.info(f'Connection to {client.address} was lost: {e}')
+        except protocol.ProtocolError as e:
+            logging.warning(f'{client.address} sent something that is not allowed: {e}')
+            client.send(protocol.error(str(e)))
+        except Exception:
+            logging.exception(f'Unknown error with {client.address}, disconnecting immediately')
+        finally:
+            logging.info(f'{client.address} disconnected')
+            if client.game != None:
+                self.leave(client)
+            client.close()
+            await writing
+
+    async def serve(self, host: str = server, port: int = port, coordinator_port: int | None = None):
+        self.port = port
+        if coordinator_port != None:
+            self.coordinator = await CoordinatorLink.connect(self.worker, coordinator_port)
+        listener = await asyncio.start_server(self.handle_client, host, port, backlog=1024, reuse_port=self.workers > 1)
+        listeners = [listener]
+        if self.workers > 1:
+            own_port = self.worker_port(self.worker)
+            listeners.append(await asyncio.start_server(partial(self.handle_client, shared=False), host, own_port, backlog=1024))
+            logging.info(f'Worker {self.worker} listening on {host}:{port} and {host}:{own_port}, waiting for connections...')
+        else:
+            logging.info(f'Listening on {host}:{port}, waiting for connections...')
+        await asyncio.gather(*(listener.serve_forever() for listener in listeners))
+
+
+def run_worker(host: str, port: int, worker: int, workers: int, coordinator_port: int):
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, stream=sys.stdout)
+    try:
+        asyncio.run(GameServer(worker, workers).serve(host, port, coordinator_port))
+    except KeyboardInterrupt:
+        pass
+
+
+async def serve_workers(host: str = server, port: int = port, workers: int = 2):
+    """Runs the coordinator here and `workers` game servers in processes of their own"""
+    coordinator = await Coordinator().serve()
+    coordinator_port = coordinator.sockets[0].getsockname()[1]
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(host, port, worker, workers, coordinator_port), name=f'Worker {worker}', daemon=True)
+        for worker in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    logging.info(f'Started {workers} workers')
+    try:
+        async with coordinator:
+            await coordinator.serve_forever()
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, stream=sys.stdout)
+    host = sys.argv[1] if len(sys.argv) > 1 else server
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    port = int(sys.argv[3]) if len(sys.argv) > 3 else port
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        # Windows cannot share a port between processes
+        workers = 1
+    try:
+        if workers > 1:
+            asyncio.run(serve_workers(host, port, workers))
+        else:
+            asyncio.run(GameServer().serve(host, port))
+    except KeyboardInterrupt:
+        pass